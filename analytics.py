@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def availability_cube(staff_availability, members, dates, shifts):
+    member_ids = {member: idx for idx, member in enumerate(members)}
+    date_ids = {date: idx for idx, date in enumerate(dates)}
+    shift_ids = {shift: idx for idx, shift in enumerate(shifts)}
+
+    cube = np.zeros((len(members), len(dates), len(shifts)), dtype=bool)
+    entries = [
+        (member_ids[member], date_ids[date], shift_ids[shift])
+        for member, availability in staff_availability.items()
+        if member in member_ids
+        for date, offered in availability
+        if date in date_ids
+        for shift in offered
+        if shift in shift_ids
+    ]
+    if entries:
+        member_col, date_col, shift_col = np.array(entries, dtype=np.intp).T
+        cube[member_col, date_col, shift_col] = True
+    return cube
+
+
+def store_cube(block, columns, rows, shift_bits):
+    # block is a members x days slice of the availability store, columns
+    # picks the dates out of it and rows gives each member's store row (-1 if
+    # the member is not in the store)
+    rows = np.asarray(rows, dtype=np.intp)
+    known = rows >= 0
+    bits = np.asarray(shift_bits, dtype=np.uint8)
+    cube = np.zeros((len(rows), len(columns), len(bits)), dtype=bool)
+    cube[known] = (block[rows[known]][:, columns, None] & bits) != 0
+    return cube
+
+
+def summarize_availability(cube, responded, weekdays, demand):
+    # cube is members x dates x shifts, demand is dates x shifts
+    n_dates, n_shifts = cube.shape[1:]
+    weekdays = np.asarray(weekdays, dtype=np.intp)
+    responded = np.asarray(responded, dtype=bool)
+
+    supply = cube.sum(axis=0)
+    known = weekdays >= 0
+    weekday_supply = np.zeros((7, n_shifts), dtype=np.int64)
+    np.add.at(weekday_supply, weekdays[known], supply[known])
+    weekday_dates = np.bincount(weekdays[known], minlength=7)
+
+    offered = cube.any(axis=2)
+    available = offered.sum(axis=0)
+    days_offered = offered.sum(axis=1)
+
+    return {
+        "members": len(responded),
+        "responded": int(responded.sum()),
+        "supply": supply,
+        "demand": np.asarray(demand, dtype=np.int64).reshape(n_dates, n_shifts),
+        "available": available,
+        "weekday_supply": weekday_supply,
+        "weekday_dates": weekday_dates,
+        "days_offered": np.bincount(days_offered[responded], minlength=n_dates + 1),
+        "offered_nothing": np.flatnonzero(responded & (days_offered == 0)),
+        "no_reply": np.flatnonzero(~responded),
+    }
@@ -0,0 +1,185 @@
+import os
+import struct
+from datetime import date
+
+import numpy as np
+
+MAGIC = b"BARAVAIL"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIII64s")
+HEADER_SIZE = 128
+# One byte per member and day: bit i is shift i, the top bit marks that the
+# member answered the form for that day
+RESPONDED = 0x80
+MAX_SHIFTS = 7
+
+
+class AvailabilityStore:
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.members_path = path + ".members"
+        with open(path, "rb") as f:
+            magic, version, start, n_days, n_members, capacity, shifts = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an availability store")
+
+        self.start = date.fromordinal(start)
+        self.n_days = n_days
+        self.n_members = n_members
+        self.capacity = capacity
+        self.shifts = shifts.rstrip(b"\0").decode("utf-8").split(",")
+        self.shift_bits = {shift: 1 << idx for idx, shift in enumerate(self.shifts)}
+
+        with open(self.members_path, "r", encoding="utf-8") as f:
+            self.members = [line.rstrip("\n") for line in f][:n_members]
+        self.member_ids = {member: idx for idx, member in enumerate(self.members)}
+        self.data = None
+        self._map()
+
+    @classmethod
+    def create(cls, path, start, n_days, shifts, capacity=1024):
+        if len(shifts) > MAX_SHIFTS:
+            raise ValueError(f"At most {MAX_SHIFTS} shifts fit in one byte")
+        with open(path, "wb") as f:
+            f.write(cls._pack_header(start, n_days, 0, capacity, shifts))
+            f.truncate(HEADER_SIZE + capacity * n_days)
+        with open(path + ".members", "w", encoding="utf-8"):
+            pass
+        return cls(path)
+
+    @classmethod
+    def open(cls, path, start, n_days, shifts):
+        if os.path.exists(path):
+            return cls(path)
+        return cls.create(path, start, n_days, shifts)
+
+    @staticmethod
+    def _pack_header(start, n_days, n_members, capacity, shifts):
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            start.toordinal(),
+            n_days,
+            n_members,
+            capacity,
+            ",".join(shifts).encode("utf-8"),
+        )
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def _map(self):
+        self.data = np.memmap(
+            self.path,
+            dtype=np.uint8,
+            mode="r" if self.read_only else "r+",
+            offset=HEADER_SIZE,
+            shape=(self.capacity, self.n_days),
+        )
+
+    def _write_header(self):
+        with open(self.path, "r+b") as f:
+            f.write(
+                self._pack_header(
+                    self.start, self.n_days, self.n_members, self.capacity, self.shifts
+                )
+            )
+
+    def _grow(self):
+        self.data.flush()
+        self.data = None
+        self.capacity *= 2
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.capacity * self.n_days)
+        self._write_header()
+        self._map()
+
+    def close(self):
+        if self.data is not None:
+            if not self.read_only:
+                self.data.flush()
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def member_id(self, member):
+        idx = self.member_ids.get(member)
+        if idx is None:
+            if self.n_members == self.capacity:
+                self._grow()
+            idx = self.n_members
+            with open(self.members_path, "a", encoding="utf-8") as f:
+                f.write(member + "\n")
+            self.members.append(member)
+            self.member_ids[member] = idx
+            self.n_members += 1
+            self._write_header()
+        return idx
+
+    def day_index(self, day):
+        idx = day.toordinal() - self.start.toordinal()
+        if not 0 <= idx < self.n_days:
+            raise ValueError(
+                f"{day} is outside the store ({self.start}, {self.n_days} days)"
+            )
+        return idx
+
+    def record(self, staff_availability, responding_members, days_by_label):
+        # A new answer replaces whatever the member had for those days before
+        columns = {label: self.day_index(day) for label, day in days_by_label.items()}
+        answered = np.fromiter(columns.values(), dtype=np.intp, count=len(columns))
+        # Form order first, so rows come back in the order the solver saw them
+        ordered = list(staff_availability)
+        ordered += sorted(set(responding_members) - set(staff_availability))
+        for member in ordered:
+            idx = self.member_id(member)
+            row = self.data[idx]
+            row[answered] = RESPONDED
+            for label, shifts in staff_availability.get(member, ()):
+                col = columns.get(label)
+                if col is not None:
+                    row[col] |= sum(self.shift_bits[shift] for shift in shifts)
+        self.data.flush()
+
+    def view(self, start=None, end=None):
+        # Zero-copy: a slice of the memory map, members x days
+        first = 0 if start is None else self.day_index(start)
+        last = self.n_days if end is None else self.day_index(end)
+        return self.data[: self.n_members, first:last]
+
+    def supply(self, start=None, end=None):
+        block = self.view(start, end)
+        return np.stack(
+            [np.count_nonzero(block & bit, axis=0) for bit in self.shift_bits.values()],
+            axis=1,
+        )
+
+    def read(self, days_by_label, members=None):
+        labels = list(days_by_label)
+        columns = [self.day_index(day) for day in days_by_label.values()]
+        if not columns:
+            return {}, set()
+        first = min(columns)
+        block = self.view()[:, first : max(columns) + 1]
+        block = block[:, [col - first for col in columns]]
+
+        wanted = None if members is None else set(members)
+        staff_availability = {}
+        responding_members = set()
+        for idx in np.flatnonzero((block & RESPONDED).any(axis=1)):
+            member = self.members[idx]
+            if wanted is not None and member not in wanted:
+                continue
+            responding_members.add(member)
+            row = block[idx]
+            staff_availability[member] = [
+                (label, [s for s, bit in self.shift_bits.items() if value & bit])
+                for label, value in zip(labels, row.tolist())
+                if value & ~RESPONDED
+            ]
+        return staff_availability, responding_members
@@ -1,10 +1,9 @@
-import random
-from datetime import datetime, timedelta
+import calendar
+from datetime import datetime
 
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+from form_header import MONTH_ABBREVS, parse_form_header
+from name_index import MemberIndex, normalize_name
+from rng_streams import RngStreams
 
 MOCK_DATA = False
 # CHOOSE YEAR HERE
@@ -20,26 +19,6 @@ class BarScheduler:
         "closing": {"color": "C6FFB4", "time": "20:20-00:30", "default_staff": 3},
     }
 
-    EXCEL_STYLES = {
-        "thin_border": Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        ),
-        "header": {
-            "fill": PatternFill(
-                start_color="E0E0E0", end_color="E0E0E0", fill_type="solid"
-            ),
-            "font": Font(bold=True, size=11),
-        },
-        "names": {
-            "fill": PatternFill(
-                start_color="F5F5F5", end_color="F5F5F5", fill_type="solid"
-            ),
-            "font": Font(bold=True, size=11),
-        },
-    }
     MONTH_NAMES = {
         1: "January",
         2: "February",
@@ -78,23 +57,81 @@ class BarScheduler:
             4: {s: c["default_staff"] for s, c in self.SHIFT_CONFIG.items()},
         }
         self.WEEKDAY_REQUIREMENTS = base_requirements.copy()
+        self.PUBLIC_HOLIDAYS = True
+        self.SPECIAL_DATES_PATH = self.USERPATH + "special_dates.csv"
+        self.calendar_requirements = {}
+        self.date_notes = {}
         self.weekend_color = "808080"
         self.no_reply_color = "404040"
         self.manual_review = []
         self.unmatched_availability = {}
         self.no_reply_members = set()
+        self.date_weekdays = {}
+        self.member_index = None
         self.morning_shift_dates = set()
+        self.form_header = None
+        self.rng_streams = None
 
     def format_date(self, day):
         return f"{day}. {self.MONTH_NAME[:3].lower()}"
 
+    def get_day(self, date_str):
+        try:
+            return int(date_str.split(".")[0])
+        except ValueError:
+            return None
+
     def get_weekday(self, date_str):
+        weekday = self.date_weekdays.get(date_str)
+        if weekday is not None:
+            return weekday
         try:
             day = int(date_str.split(".")[0])
             return datetime(self.YEAR, self.MONTH, day).weekday()
         except ValueError:
             return -1
 
+    def get_month_weekdays(self):
+        first_weekday, days_in_month = calendar.monthrange(self.YEAR, self.MONTH)
+        return [None] + [(first_weekday + day) % 7 for day in range(days_in_month)]
+
+    def build_calendar(self, work_days):
+        month_weekdays = self.get_month_weekdays()
+        labels = {}
+        for date, day in work_days.items():
+            if day is None or not 1 <= day < len(month_weekdays):
+                print(f"Warning: {date} is not in {self.MONTH_NAME} {self.YEAR}")
+                continue
+            labels[day] = date
+
+        all_dates = []
+        self.date_weekdays = {}
+        if not labels:
+            return all_dates
+
+        # Form dates are always kept. A weekend with no form date collapses
+        # into a single placeholder column, the first weekend day of the run
+        first, last = min(labels), max(labels)
+        weekend_column = False
+        for day in range(first, last + 1):
+            weekday = month_weekdays[day]
+            date = labels.get(day, self.format_date(day))
+            self.date_weekdays[date] = weekday
+            if weekday < 5:
+                weekend_column = False
+                all_dates.append(date)
+            elif day in labels:
+                weekend_column = True
+                all_dates.append(date)
+            elif not weekend_column:
+                end = day
+                while end <= last and month_weekdays[end] >= 5:
+                    end += 1
+                if not any(d in labels for d in range(day, end)):
+                    weekend_column = True
+                    all_dates.append(date)
+        return all_dates
+
     def is_weekend(self, date_str):
         return self.get_weekday(date_str) >= 5
 
@@ -107,66 +144,108 @@ class BarScheduler:
         if " - " in date_str:
             date_str = date_str.split(" - ")[0]
 
-        if self._is_morning_shift_date(date_str):
+        if self._is_morning_shift_date(date_str) and not self.is_closed(
+            date, "morning"
+        ):
             valid_shifts.append("morning")
 
-        if self.is_monday(date):
-            valid_shifts.extend(["opening", "middle"])
-        elif not self.is_weekend(date):
-            valid_shifts.extend(["opening", "middle", "closing"])
+        if not self.is_weekend(date):
+            valid_shifts.extend(
+                shift
+                for shift in ["opening", "middle", "closing"]
+                if not self.is_closed(date, shift)
+            )
 
         return valid_shifts
 
     def get_next_weekend_dates(self, current_date, next_date):
-        try:
-            current_day = int(current_date.split(".")[0])
-            next_day = int(next_date.split(".")[0])
-            weekend_dates = []
-
-            current = datetime(self.YEAR, self.MONTH, current_day)
-            while current.weekday() < 5 and current.day < next_day:
-                current = current + timedelta(days=1)
-
-            if current.day < next_day:
-                weekend_dates.append("WEEKEND")
-
-            return weekend_dates
-        except ValueError:
+        current_day = self.get_day(current_date)
+        next_day = self.get_day(next_date)
+        month_weekdays = self.get_month_weekdays()
+        if current_day is None or next_day is None or current_day < 1:
             return []
 
+        days = range(current_day, min(next_day, len(month_weekdays)))
+        if any(month_weekdays[day] >= 5 for day in days):
+            return ["WEEKEND"]
+        return []
+
     def get_staff_requirement(self, date_str, shift_type):
+        date_requirements = self.calendar_requirements.get(date_str)
+        if date_requirements is not None and shift_type in date_requirements:
+            return date_requirements[shift_type]
+        return self.get_base_requirement(date_str, shift_type)
+
+    def get_base_requirement(self, date_str, shift_type):
+        if self.is_monday(date_str) and shift_type == "closing":
+            return 0
         weekday = self.get_weekday(date_str)
         return self.WEEKDAY_REQUIREMENTS.get(weekday, {}).get(
             shift_type, self.SHIFT_CONFIG[shift_type]["default_staff"]
         )
 
-    def get_morning_shift_dates(self, df):
-        morning_cols = [col for col in df.columns if "kan du ha morgenvakt?" in col]
-        morning_dates = set()
+    def is_closed(self, date_str, shift_type):
+        return self.get_staff_requirement(date_str, shift_type) == 0
 
-        for col in morning_cols:
-            try:
-                date_part = col.split("[")[-1].split("]")[0]
-                morning_dates.add(date_part)
-            except IndexError:
-                print(f"Warning: Could not parse date from column: {col}")
+    def load_special_dates(self, all_dates):
+        from special_dates import (
+            load_overrides,
+            norwegian_holidays,
+            resolve_requirements,
+        )
+
+        shifts = list(self.SHIFT_CONFIG)
+        try:
+            overrides = load_overrides(self.SPECIAL_DATES_PATH, shifts)
+        except FileNotFoundError:
+            overrides = []
+        days = {
+            date: datetime(self.YEAR, self.MONTH, self.get_day(date)).date()
+            for date in all_dates
+            if not self.is_weekend(date)
+        }
+        self.calendar_requirements, self.date_notes = resolve_requirements(
+            days,
+            shifts,
+            self.get_base_requirement,
+            overrides,
+            norwegian_holidays(self.YEAR) if self.PUBLIC_HOLIDAYS else None,
+        )
+        for date, note in self.date_notes.items():
+            print(f"{date}: {note}")
+
+    def get_form_header(self, columns):
+        return parse_form_header(
+            columns,
+            self.YEAR,
+            self.MONTH,
+            {self.MONTH_NAME[:3].lower(), MONTH_ABBREVS[self.MONTH]},
+            "Navn og etternavn",
+        )
 
-        return morning_dates
+    def get_morning_shift_dates(self, df):
+        return self.get_form_header(df.columns).morning_dates
 
-    def find_member_match(self, input_name, member_list):
-        def normalize_name(name):
-            return "".join(c.lower() for c in name if c.isalnum())
+    def get_member_index(self, member_list):
+        if self.member_index is None or self.member_index.source is not member_list:
+            self.member_index = MemberIndex(member_list)
+        return self.member_index
 
-        if input_name.lower() in (m.lower() for m in member_list):
-            return next(m for m in member_list if m.lower() == input_name.lower())
+    def find_member_match(self, input_name, member_list):
+        index = self.get_member_index(member_list)
+        exact = index.by_lower.get(input_name.lower())
+        if exact is not None:
+            return exact
 
         matches = []
         input_normalized = normalize_name(input_name)
         input_parts = set(normalize_name(p) for p in input_name.split())
+        fuzzy_scores = index.fuzzy_scores(input_parts)
 
-        for member in member_list:
-            member_normalized = normalize_name(member)
-            member_parts = set(normalize_name(p) for p in member.split())
+        for member_idx in index.candidates(input_name, input_parts, fuzzy_scores):
+            member = index.members[member_idx]
+            member_normalized = index.normalized[member_idx]
+            member_parts = index.parts[member_idx]
 
             score = 0
             if input_normalized == member_normalized:
@@ -184,11 +263,15 @@ class BarScheduler:
                         else 0
                     )
 
+            # Typos score on the same scale, and break ties between members
+            # that share a first name
+            fuzzy = fuzzy_scores.get(member_idx, 0)
+            score = max(score, fuzzy)
             if score > 0:
-                matches.append((member, score))
+                matches.append((member, score, fuzzy))
 
         if matches:
-            best_match = max(matches, key=lambda x: x[1])
+            best_match = max(matches, key=lambda x: (x[1], x[2]))
             if best_match[1] >= self.MIN_CONFIDENCE_THRESHOLD:
                 return best_match[0]
             elif best_match[1] >= self.PARTIAL_MATCH_THRESHOLD:
@@ -212,33 +295,26 @@ class BarScheduler:
 
     def parse_shifts(self, row, date_str):
         shifts = []
-        date_check = date_str.split(" - ")[0] if " - " in date_str else date_str
-
-        date_col = next((col for col in row.index if date_str in col), None)
-        if date_col:
-            cell_value = row[date_col]
-            if (
-                isinstance(cell_value, str)
-                and "Kan ikke jobbe denne dagen" not in cell_value
-            ):
-                shift_times = {
-                    "opening": "12:30-17:00",
-                    "middle": "16:50-20:30",
-                    "closing": "20:20-00:30",
-                }
-                for shift_type, time in shift_times.items():
-                    if time in cell_value:
-                        if not (self.is_monday(date_str) and shift_type == "closing"):
-                            shifts.append(shift_type)
-
-        day = int(date_check.split(".")[0])
-        month_abbrev = self.MONTH_NAME[:3].lower()
-        morning_cols = [col for col in row.index if "kan du ha morgenvakt?" in col]
-
-        for morning_col in morning_cols:
-            if f"[{day}. {month_abbrev}]" in morning_col and row[morning_col] == "Ja":
-                shifts.append("morning")
-                break
+        day = self.form_header.day_by_label[date_str]
+
+        cell_value = row.iloc[self.form_header.date_columns[day]]
+        if (
+            isinstance(cell_value, str)
+            and "Kan ikke jobbe denne dagen" not in cell_value
+        ):
+            shift_times = {
+                "opening": "12:30-17:00",
+                "middle": "16:50-20:30",
+                "closing": "20:20-00:30",
+            }
+            for shift_type, time in shift_times.items():
+                if time in cell_value:
+                    if not (self.is_monday(date_str) and shift_type == "closing"):
+                        shifts.append(shift_type)
+
+        morning_idx = self.form_header.morning_columns.get(day)
+        if morning_idx is not None and row.iloc[morning_idx] == "Ja":
+            shifts.append("morning")
 
         return shifts
 
@@ -271,18 +347,18 @@ class BarScheduler:
 
         for member in no_reply_members:
             shifts_needed = 2
-            random.shuffle(workdays)
+            self.rng("no_reply").shuffle(workdays)
 
             for date in workdays:
                 if shifts_needed <= 0:
                     break
 
-                valid_shifts = (
-                    ["opening", "middle"]
-                    if self.is_monday(date)
-                    else ["opening", "middle", "closing"]
-                )
-                random.shuffle(valid_shifts)
+                valid_shifts = [
+                    shift
+                    for shift in self.get_available_shifts(date)
+                    if shift != "morning"
+                ]
+                self.rng("shifts").shuffle(valid_shifts)
 
                 for shift in valid_shifts:
                     if schedule[date][shift] is not None and len(
@@ -294,11 +370,11 @@ class BarScheduler:
 
             if shifts_needed == 2:
                 for date in workdays:
-                    valid_shifts = (
-                        ["opening", "middle"]
-                        if self.is_monday(date)
-                        else ["opening", "middle", "closing"]
-                    )
+                    valid_shifts = [
+                        shift
+                        for shift in self.get_available_shifts(date)
+                        if shift != "morning"
+                    ]
                     for shift in valid_shifts:
                         if schedule[date][shift] is not None and len(
                             schedule[date][shift]
@@ -314,8 +390,9 @@ class BarScheduler:
             if self.is_weekend(date):
                 continue
 
-            if self.is_monday(date):
-                schedule[date]["closing"] = None
+            for shift_type in schedule[date]:
+                if self.is_closed(date, shift_type):
+                    schedule[date][shift_type] = None
 
             for shift_type, staff_list in schedule[date].items():
                 if staff_list is not None:
@@ -343,30 +420,58 @@ class BarScheduler:
 
         return schedule
 
+    def get_excel_styles(self):
+        from openpyxl.styles import Border, Font, PatternFill, Side
+
+        return {
+            "thin_border": Border(
+                left=Side(style="thin"),
+                right=Side(style="thin"),
+                top=Side(style="thin"),
+                bottom=Side(style="thin"),
+            ),
+            "header": {
+                "fill": PatternFill(
+                    start_color="E0E0E0", end_color="E0E0E0", fill_type="solid"
+                ),
+                "font": Font(bold=True, size=11),
+            },
+            "names": {
+                "fill": PatternFill(
+                    start_color="F5F5F5", end_color="F5F5F5", fill_type="solid"
+                ),
+                "font": Font(bold=True, size=11),
+            },
+        }
+
     def apply_excel_formatting(self, ws, all_dates, all_members):
+        from openpyxl.styles import Alignment, Font
+        from openpyxl.utils import get_column_letter
+
+        styles = self.get_excel_styles()
         ws.freeze_panes = "B2"
 
         for cell in ws[1]:
-            cell.fill = self.EXCEL_STYLES["header"]["fill"]
-            cell.font = self.EXCEL_STYLES["header"]["font"]
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.fill = styles["header"]["fill"]
+            cell.font = styles["header"]["font"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="center", vertical="center")
 
         for row in range(2, len(all_members) + 2):
             cell = ws.cell(row=row, column=1)
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="left", vertical="center", indent=1)
 
             name = cell.value
             if name not in self.no_reply_members:
-                cell.font = self.EXCEL_STYLES["names"]["font"]
-                cell.fill = self.EXCEL_STYLES["names"]["fill"]
+                cell.font = styles["names"]["font"]
+                cell.fill = styles["names"]["fill"]
 
         last_col = len(all_dates) + 3
         for row in range(2, len(all_members) + 2):
             for col in range(2, last_col + 1):
                 cell = ws.cell(row=row, column=col)
-                cell.border = self.EXCEL_STYLES["thin_border"]
+                cell.border = styles["thin_border"]
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
         sum_row = len(all_members) + 3
@@ -375,13 +480,13 @@ class BarScheduler:
         for row in total_rows:
             cell = ws.cell(row=row, column=1)
             cell.font = Font(bold=True)
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="left", vertical="center")
-            cell.fill = self.EXCEL_STYLES["header"]["fill"]
+            cell.fill = styles["header"]["fill"]
 
             for col in range(2, last_col + 1):
                 cell = ws.cell(row=row, column=col)
-                cell.border = self.EXCEL_STYLES["thin_border"]
+                cell.border = styles["thin_border"]
                 cell.font = Font(bold=True)
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
@@ -402,7 +507,7 @@ class BarScheduler:
             if self._count_shifts(schedule, staff_name) >= shifts_needed:
                 continue
 
-            random.shuffle(availability)
+            self.rng("respondents").shuffle(availability)
             for date, available_shifts in availability:
                 if not (
                     self.is_weekend(date)
@@ -422,13 +527,13 @@ class BarScheduler:
             if self._count_shifts(schedule, member) >= shifts_needed:
                 continue
 
-            random.shuffle(workdays)
+            self.rng("no_reply").shuffle(workdays)
             for date in workdays:
-                valid_shifts = (
-                    ["opening", "middle"]
-                    if self.is_monday(date)
-                    else ["opening", "middle", "closing"]
-                )
+                valid_shifts = [
+                    shift
+                    for shift in self.get_available_shifts(date)
+                    if shift != "morning"
+                ]
                 if self._try_assign_shift(schedule, date, valid_shifts, member):
                     if self._count_shifts(schedule, member) >= shifts_needed:
                         break
@@ -459,7 +564,7 @@ class BarScheduler:
                 return True
 
         other_shifts = [s for s in valid_shifts if s != "morning"]
-        random.shuffle(other_shifts)
+        self.rng("shifts").shuffle(other_shifts)
         for shift in other_shifts:
             if schedule[date].get(shift) is not None:
                 required = self.get_staff_requirement(date, shift)
@@ -471,6 +576,11 @@ class BarScheduler:
 
         return False
 
+    def rng(self, stage):
+        if self.rng_streams is None:
+            self.rng_streams = RngStreams(SEED)
+        return self.rng_streams.stage(stage)
+
     def _count_shifts(self, schedule, staff_name):
         return sum(
             1
@@ -489,8 +599,11 @@ class BarScheduler:
             "morning": [] if self._is_morning_shift_date(date.strip()) else None,
             "opening": [],
             "middle": [],
-            "closing": None if self.is_monday(date) else [],
+            "closing": [],
         }
+        for shift_type in schedule:
+            if self.is_closed(date, shift_type):
+                schedule[shift_type] = None
         return schedule
 
     def _has_shift_on_date(self, schedule, date, staff_name):
@@ -500,38 +613,26 @@ class BarScheduler:
         return False
 
     def create_schedule(self):
-        random.seed(SEED)
+        self.rng_streams = RngStreams(SEED)
         try:
             with open(self.USERPATH + "members.txt", "r") as f:
                 all_members = [line.strip() for line in f if line.strip()]
         except FileNotFoundError:
             raise FileNotFoundError("Could not find members.txt file")
 
+        import pandas as pd
+
         df = pd.read_csv(self.FILEPATH)
+        self.form_header = self.get_form_header(df.columns)
         self.morning_shift_dates = self.get_morning_shift_dates(df)
         self.update_shift_requirements(df)
 
-        date_cols = [
-            col
-            for col in df.columns
-            if f"{self.MONTH_NAME[:3].lower()} -" in col.lower()
-        ]
-        work_dates = [col.split("[")[-1].split("]")[0].strip() for col in date_cols]
+        work_dates = self.form_header.work_dates
 
-        all_dates = []
-        current_date = None
-        for i, date in enumerate(work_dates):
-            if current_date:
-                current_day = int(current_date.split(".")[0])
-                next_day = int(date.split(".")[0])
-                current = datetime(self.YEAR, self.MONTH, current_day)
-                while current.weekday() < 5 and current.day < next_day:
-                    current = current + timedelta(days=1)
-                    if current.day < next_day:
-                        weekend_date = f"{current.day}. {self.MONTH_NAME[:3].lower()}"
-                        all_dates.append(weekend_date)
-            all_dates.append(date)
-            current_date = date
+        all_dates = self.build_calendar(
+            {date: self.form_header.day_by_label[date] for date in work_dates}
+        )
+        self.load_special_dates(all_dates)
 
         schedule = {}
         for date in all_dates:
@@ -570,6 +671,9 @@ class BarScheduler:
         )
         schedule = self.validate_schedule(schedule, all_dates)
 
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill
+
         wb = Workbook()
         ws = wb.active
         ws.title = "Schedule"
@@ -634,7 +738,7 @@ class BarScheduler:
                             )
 
         for date in all_dates:
-            if self.is_monday(date):
+            if not self.is_weekend(date) and self.is_closed(date, "closing"):
                 col_idx = all_dates.index(date) + 2
                 for row_idx in range(2, len(all_members) + 2):
                     cell = ws.cell(row=row_idx, column=col_idx)
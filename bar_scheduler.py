@@ -1,12 +1,29 @@
-import random
-from datetime import datetime, timedelta
-
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+import argparse
+import calendar
+import csv
+import heapq
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from time import perf_counter, sleep
+
+from form_header import MONTH_ABBREVS, WEEKDAY_NAMES, parse_form_header
+from history_store import HistoryStore
+from ics_export import IcsExporter
+from name_index import MemberIndex, normalize_name
+from rng_streams import RngStreams
+from schedule_cache import ScheduleCache
+from schedule_diff import diff_schedules, load_schedule
 
 MOCK_DATA = True
+USE_CACHE = True
+USE_HISTORY = True
+WARM_START = False
+STREAMING_INGEST = False
+AVAILABILITY_STORE = False
+SEED = None
 
 
 class BarScheduler:
@@ -16,26 +33,6 @@ class BarScheduler:
         "closing": {"color": "C6FFB4", "time": "20:20-00:30", "default_staff": 3},
     }
 
-    EXCEL_STYLES = {
-        "thin_border": Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        ),
-        "header": {
-            "fill": PatternFill(
-                start_color="E0E0E0", end_color="E0E0E0", fill_type="solid"
-            ),
-            "font": Font(bold=True, size=11),
-        },
-        "names": {
-            "fill": PatternFill(
-                start_color="F5F5F5", end_color="F5F5F5", fill_type="solid"
-            ),
-            "font": Font(bold=True, size=11),
-        },
-    }
     MONTH_NAMES = {
         1: "January",
         2: "February",
@@ -51,6 +48,12 @@ class BarScheduler:
         12: "December",
     }
 
+    NAME_COLUMN = "Navn og etternavn"
+    EMAIL_COLUMN = "E-postadresse"
+    TIMESTAMP_COLUMN = "Tidsmerke"
+    COMMENT_COLUMN = "Kommentar"
+    TIMESTAMP_FORMAT = "%d.%m.%Y kl. %H:%M.%S"
+
     MIN_CONFIDENCE_THRESHOLD = 0.8
     PARTIAL_MATCH_THRESHOLD = 0.5
 
@@ -75,70 +78,160 @@ class BarScheduler:
             3: {"opening": 2, "middle": 2, "closing": 2},  # Thursday
             4: {s: c["default_staff"] for s, c in self.SHIFT_CONFIG.items()},  # Friday
         }
+        self.PUBLIC_HOLIDAYS = True
+        self.SPECIAL_DATES_PATH = self.USERPATH + "special_dates.csv"
+        self.calendar_requirements = {}
+        self.date_notes = {}
+        self.violations = []
         self.weekend_color = "808080"
         self.no_reply_color = "404040"
         self.manual_review = []
         self.unmatched_availability = {}
         self.no_reply_members = set()
+        self.date_weekdays = {}
+        self.member_index = None
+        self.SEED = SEED
+        self.WORKER = 0
+        self.rng_streams = None
+        self.SOLVER_MODE = "greedy"
+        self.CACHE_DIR = self.USERPATH + ".schedule_cache/"
+        self.CACHE_MAX_BYTES = 64 * 1024 * 1024
+        self.CHUNK_SIZE = 5000
+        self.STORE_PATH = self.USERPATH + f"availability_{self.YEAR}.bin"
+        self.READ_FROM_STORE = False
+        self.HISTORY_PATH = self.USERPATH + "history.sqlite3"
+        self.VENUE = ""
+        self.history_counts = {}
+        self.WARM_START = WARM_START
+        self.TIME_BUDGET = 5.0
+        self.MAX_ITERATIONS = None
+        self.PREFERENCE_WEIGHTS = {"comment": 1.0, "form": 2.0}
+        self.member_comments = {}
+        self.preferences = None
+        self.CRITICALITY = True
 
     def format_date(self, day):
         return f"{day}. {self.MONTH_NAME[:3].lower()}"
 
+    def get_day(self, date_str):
+        try:
+            return int(date_str.split(".")[0])
+        except ValueError:
+            return None
+
     def get_weekday(self, date_str):
+        weekday = self.date_weekdays.get(date_str)
+        if weekday is not None:
+            return weekday
         try:
             day = int(date_str.split(".")[0])
             return datetime(self.YEAR, self.MONTH, day).weekday()
         except ValueError:
             return -1
 
+    def get_month_weekdays(self):
+        first_weekday, days_in_month = calendar.monthrange(self.YEAR, self.MONTH)
+        return [None] + [(first_weekday + day) % 7 for day in range(days_in_month)]
+
+    def build_calendar(self, work_days):
+        month_weekdays = self.get_month_weekdays()
+        labels = {}
+        for date, day in work_days.items():
+            if day is None or not 1 <= day < len(month_weekdays):
+                print(
+                    f"Warning: {date} is not in {self.MONTH_NAME} {self.YEAR}",
+                    file=sys.stderr,
+                )
+                continue
+            labels[day] = date
+
+        all_dates = []
+        self.date_weekdays = {}
+        if not labels:
+            return all_dates
+
+        # Form dates are always kept. A weekend with no form date collapses
+        # into a single placeholder column, the first weekend day of the run
+        first, last = min(labels), max(labels)
+        weekend_column = False
+        for day in range(first, last + 1):
+            weekday = month_weekdays[day]
+            date = labels.get(day, self.format_date(day))
+            self.date_weekdays[date] = weekday
+            if weekday < 5:
+                weekend_column = False
+                all_dates.append(date)
+            elif day in labels:
+                weekend_column = True
+                all_dates.append(date)
+            elif not weekend_column:
+                end = day
+                while end <= last and month_weekdays[end] >= 5:
+                    end += 1
+                if not any(d in labels for d in range(day, end)):
+                    weekend_column = True
+                    all_dates.append(date)
+        return all_dates
+
     def is_weekend(self, date_str):
         return self.get_weekday(date_str) >= 5
 
     def is_monday(self, date_str):
         return self.get_weekday(date_str) == 0
 
+    def is_closed(self, date_str, shift_type):
+        return self.get_staff_requirement(date_str, shift_type) == 0
+
     def get_available_shifts(self, date):
-        if self.is_monday(date):
-            return ["opening", "middle"]
-        return ["opening", "middle", "closing"]
+        return [shift for shift in self.SHIFT_CONFIG if not self.is_closed(date, shift)]
 
     def get_next_weekend_dates(self, current_date, next_date):
-        try:
-            current_day = int(current_date.split(".")[0])
-            next_day = int(next_date.split(".")[0])
-            weekend_dates = []
-
-            current = datetime(self.YEAR, self.MONTH, current_day)
-            while current.weekday() < 5 and current.day < next_day:
-                current = current + timedelta(days=1)
-
-            if current.day < next_day:
-                weekend_dates.append("WEEKEND")
-
-            return weekend_dates
-        except ValueError:
+        current_day = self.get_day(current_date)
+        next_day = self.get_day(next_date)
+        month_weekdays = self.get_month_weekdays()
+        if current_day is None or next_day is None or current_day < 1:
             return []
 
+        days = range(current_day, min(next_day, len(month_weekdays)))
+        if any(month_weekdays[day] >= 5 for day in days):
+            return ["WEEKEND"]
+        return []
+
     def get_staff_requirement(self, date_str, shift_type):
+        date_requirements = self.calendar_requirements.get(date_str)
+        if date_requirements is not None and shift_type in date_requirements:
+            return date_requirements[shift_type]
+        return self.get_base_requirement(date_str, shift_type)
+
+    def get_base_requirement(self, date_str, shift_type):
+        # The bar never has a closing shift on Mondays
+        if self.is_monday(date_str) and shift_type == "closing":
+            return 0
         weekday = self.get_weekday(date_str)
         return self.WEEKDAY_REQUIREMENTS.get(weekday, {}).get(
             shift_type, self.SHIFT_CONFIG[shift_type]["default_staff"]
         )
 
-    def find_member_match(self, input_name, member_list):
-        def normalize_name(name):
-            return "".join(c.lower() for c in name if c.isalnum())
+    def get_member_index(self, member_list):
+        if self.member_index is None or self.member_index.source is not member_list:
+            self.member_index = MemberIndex(member_list)
+        return self.member_index
 
-        if input_name.lower() in (m.lower() for m in member_list):
-            return next(m for m in member_list if m.lower() == input_name.lower())
+    def find_member_match(self, input_name, member_list):
+        index = self.get_member_index(member_list)
+        exact = index.by_lower.get(input_name.lower())
+        if exact is not None:
+            return exact
 
         matches = []
         input_normalized = normalize_name(input_name)
         input_parts = set(normalize_name(p) for p in input_name.split())
+        fuzzy_scores = index.fuzzy_scores(input_parts)
 
-        for member in member_list:
-            member_normalized = normalize_name(member)
-            member_parts = set(normalize_name(p) for p in member.split())
+        for member_idx in index.candidates(input_name, input_parts, fuzzy_scores):
+            member = index.members[member_idx]
+            member_normalized = index.normalized[member_idx]
+            member_parts = index.parts[member_idx]
 
             score = 0
             if input_normalized == member_normalized:
@@ -156,11 +249,15 @@ class BarScheduler:
                         else 0
                     )
 
+            # Typos score on the same scale, and break ties between members
+            # that share a first name
+            fuzzy = fuzzy_scores.get(member_idx, 0)
+            score = max(score, fuzzy)
             if score > 0:
-                matches.append((member, score))
+                matches.append((member, score, fuzzy))
 
         if matches:
-            best_match = max(matches, key=lambda x: x[1])
+            best_match = max(matches, key=lambda x: (x[1], x[2]))
             if best_match[1] >= self.MIN_CONFIDENCE_THRESHOLD:
                 return best_match[0]
             elif best_match[1] >= self.PARTIAL_MATCH_THRESHOLD:
@@ -212,92 +309,118 @@ class BarScheduler:
                         return True
         return False
 
-    def assign_no_reply_shifts(self, schedule, all_dates, no_reply_members):
-        workdays = [date for date in all_dates if not self.is_weekend(date)]
-
-        for member in no_reply_members:
-            shifts_needed = 2
-            random.shuffle(workdays)
-
-            for date in workdays:
-                if shifts_needed <= 0:
-                    break
-
-                valid_shifts = (
-                    ["opening", "middle"]
-                    if self.is_monday(date)
-                    else ["opening", "middle", "closing"]
-                )
-                random.shuffle(valid_shifts)
-
-                for shift in valid_shifts:
-                    if schedule[date][shift] is not None and len(
-                        schedule[date][shift]
-                    ) < self.get_staff_requirement(date, shift):
-                        schedule[date][shift].append(member)
-                        shifts_needed -= 1
-                        break
-
-            if shifts_needed == 2:
-                for date in workdays:
-                    valid_shifts = (
-                        ["opening", "middle"]
-                        if self.is_monday(date)
-                        else ["opening", "middle", "closing"]
-                    )
-                    for shift in valid_shifts:
-                        if schedule[date][shift] is not None and len(
-                            schedule[date][shift]
-                        ) < self.get_staff_requirement(date, shift):
-                            schedule[date][shift].append(member)
-                            break
-                    else:
-                        continue
-                    break
+    def assign_no_reply_shifts(
+        self, schedule, all_dates, no_reply_members, shifts_needed=2
+    ):
+        loads = {}
+        worked = {}
+        for date, shifts in schedule.items():
+            for staff_list in shifts.values():
+                for member in staff_list or ():
+                    loads[member] = loads.get(member, 0) + 1
+                    worked.setdefault(member, set()).add(self.get_day(date))
+
+        rng = self.rng("no_reply")
+        # Under-filled slots keyed by how many people they still miss, so the
+        # emptiest slot is always handed out next and coverage stays even
+        slots = []
+        for date in all_dates:
+            if self.is_weekend(date):
+                continue
+            for shift in self.get_available_shifts(date):
+                staff_list = schedule[date][shift]
+                if staff_list is None:
+                    continue
+                missing = self.get_staff_requirement(date, shift) - len(staff_list)
+                if missing > 0:
+                    slots.append((-missing, rng.random(), date, shift))
+        heapq.heapify(slots)
+
+        for member in self.order_by_history(no_reply_members):
+            days = worked.setdefault(member, set())
+            skipped = []
+            while slots and loads.get(member, 0) < shifts_needed:
+                slot = heapq.heappop(slots)
+                neg_missing, _, date, shift = slot
+                day = self.get_day(date)
+                if day in days or day - 1 in days or day + 1 in days:
+                    skipped.append(slot)
+                    continue
+
+                schedule[date][shift].append(member)
+                loads[member] = loads.get(member, 0) + 1
+                days.add(day)
+                if neg_missing < -1:
+                    heapq.heappush(slots, (neg_missing + 1, rng.random(), date, shift))
+            for slot in skipped:
+                heapq.heappush(slots, slot)
+        return schedule
 
     def validate_schedule(self, schedule, all_dates):
         for date in all_dates:
-            if self.is_monday(date):
-                schedule[date]["closing"] = None
-
-                for shift in ["opening", "middle"]:
-                    if schedule[date][shift] is not None:
-                        required = self.get_staff_requirement(date, shift)
-                        schedule[date][shift] = schedule[date][shift][:required]
-            else:
-                for shift_type in ["opening", "middle", "closing"]:
-                    if schedule[date][shift_type] is not None:
-                        required = self.get_staff_requirement(date, shift_type)
-                        schedule[date][shift_type] = schedule[date][shift_type][
-                            :required
-                        ]
+            if self.is_weekend(date):
+                continue
+            for shift_type in ["opening", "middle", "closing"]:
+                if self.is_closed(date, shift_type):
+                    schedule[date][shift_type] = None
+                elif schedule[date][shift_type] is not None:
+                    required = self.get_staff_requirement(date, shift_type)
+                    schedule[date][shift_type] = schedule[date][shift_type][:required]
 
         return schedule
 
+    def get_excel_styles(self):
+        from openpyxl.styles import Border, Font, PatternFill, Side
+
+        return {
+            "thin_border": Border(
+                left=Side(style="thin"),
+                right=Side(style="thin"),
+                top=Side(style="thin"),
+                bottom=Side(style="thin"),
+            ),
+            "header": {
+                "fill": PatternFill(
+                    start_color="E0E0E0", end_color="E0E0E0", fill_type="solid"
+                ),
+                "font": Font(bold=True, size=11),
+            },
+            "names": {
+                "fill": PatternFill(
+                    start_color="F5F5F5", end_color="F5F5F5", fill_type="solid"
+                ),
+                "font": Font(bold=True, size=11),
+            },
+        }
+
     def apply_excel_formatting(self, ws, all_dates, all_members):
+        from openpyxl.styles import Alignment, Font
+        from openpyxl.utils import get_column_letter
+
+        styles = self.get_excel_styles()
         ws.freeze_panes = "B2"
 
         for cell in ws[1]:
-            cell.fill = self.EXCEL_STYLES["header"]["fill"]
-            cell.font = self.EXCEL_STYLES["header"]["font"]
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.fill = styles["header"]["fill"]
+            cell.font = styles["header"]["font"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="center", vertical="center")
 
         for row in range(2, len(all_members) + 2):
             cell = ws.cell(row=row, column=1)
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="left", vertical="center", indent=1)
 
             name = cell.value
             if name not in self.no_reply_members:
-                cell.font = self.EXCEL_STYLES["names"]["font"]
-                cell.fill = self.EXCEL_STYLES["names"]["fill"]
+                cell.font = styles["names"]["font"]
+                cell.fill = styles["names"]["fill"]
 
         last_col = len(all_dates) + 3
         for row in range(2, len(all_members) + 2):
             for col in range(2, last_col + 1):
                 cell = ws.cell(row=row, column=col)
-                cell.border = self.EXCEL_STYLES["thin_border"]
+                cell.border = styles["thin_border"]
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
         sum_row = len(all_members) + 3
@@ -306,13 +429,13 @@ class BarScheduler:
         for row in total_rows:
             cell = ws.cell(row=row, column=1)
             cell.font = Font(bold=True)
-            cell.border = self.EXCEL_STYLES["thin_border"]
+            cell.border = styles["thin_border"]
             cell.alignment = Alignment(horizontal="left", vertical="center")
-            cell.fill = self.EXCEL_STYLES["header"]["fill"]
+            cell.fill = styles["header"]["fill"]
 
             for col in range(2, last_col + 1):
                 cell = ws.cell(row=row, column=col)
-                cell.border = self.EXCEL_STYLES["thin_border"]
+                cell.border = styles["thin_border"]
                 cell.font = Font(bold=True)
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
@@ -329,11 +452,17 @@ class BarScheduler:
     def assign_shifts(
         self, schedule, dates, staff_availability, all_members, shifts_needed=1
     ):
-        for staff_name, availability in staff_availability.items():
+        rng = self.rng("respondents")
+        for staff_name in self.order_by_history(staff_availability):
             if self._count_shifts(schedule, staff_name) >= shifts_needed:
                 continue
 
-            random.shuffle(availability)
+            # Shuffle a copy, so every restart sees the same input order and
+            # can be replayed on its own
+            availability = list(staff_availability[staff_name])
+            rng.shuffle(availability)
+            if self.preferences is not None:
+                self.preferences.rank_dates(staff_name, availability)
             for date, shifts in availability:
                 if not (
                     self.is_weekend(date)
@@ -344,25 +473,30 @@ class BarScheduler:
                         if self._count_shifts(schedule, staff_name) >= shifts_needed:
                             break
 
-        workdays = [d for d in dates if not self.is_weekend(d)]
-        for member in self.no_reply_members:
-            if self._count_shifts(schedule, member) >= shifts_needed:
-                continue
-
-            random.shuffle(workdays)
-            for date in workdays:
-                valid_shifts = (
-                    ["opening", "middle"]
-                    if self.is_monday(date)
-                    else ["opening", "middle", "closing"]
-                )
-                if self._try_assign_shift(schedule, date, valid_shifts, member):
-                    if self._count_shifts(schedule, member) >= shifts_needed:
-                        break
+        self.assign_no_reply_shifts(
+            schedule, dates, self.no_reply_members, shifts_needed=shifts_needed
+        )
         return schedule
 
+    def reset_rng(self, worker=None):
+        self.rng_streams = RngStreams(
+            self.SEED, self.WORKER if worker is None else worker
+        )
+        return self.rng_streams
+
+    def rng(self, stage):
+        if self.rng_streams is None:
+            self.reset_rng()
+        return self.rng_streams.stage(stage)
+
+    def order_by_history(self, members):
+        # Members who have worked least over past months get first pick
+        return sorted(members, key=lambda member: self.history_counts.get(member, 0))
+
     def _try_assign_shift(self, schedule, date, valid_shifts, staff_name):
-        random.shuffle(valid_shifts)
+        self.rng("shifts").shuffle(valid_shifts)
+        if self.preferences is not None:
+            self.preferences.rank_shifts(staff_name, date, valid_shifts)
         for shift in valid_shifts:
             if schedule[date][shift] is not None and len(
                 schedule[date][shift]
@@ -379,74 +513,1195 @@ class BarScheduler:
             if staff_list is not None and staff_name in staff_list
         )
 
-    def create_schedule(self):
-        print(self.USERPATH + "members.txt")
-        print("/Users/martin/Desktop/bar-scheduler/members.txt")
+    def get_cache_config(self):
+        return {
+            "year": self.YEAR,
+            "month": self.MONTH,
+            "shift_config": self.SHIFT_CONFIG,
+            "weekday_requirements": self.WEEKDAY_REQUIREMENTS,
+            "public_holidays": self.PUBLIC_HOLIDAYS,
+            "history": self.history_counts,
+            "warm_start": self.WARM_START,
+            "time_budget": self.TIME_BUDGET,
+            "max_iterations": self.MAX_ITERATIONS,
+            "preference_weights": self.PREFERENCE_WEIGHTS,
+            "worker": self.WORKER,
+            "criticality": self.CRITICALITY,
+            "availability_store": AVAILABILITY_STORE,
+        }
+
+    def get_month_bounds(self):
+        start = datetime(self.YEAR, self.MONTH, 1)
+        end = datetime(self.YEAR + self.MONTH // 12, self.MONTH % 12 + 1, 1)
+        return start.date().isoformat(), end.date().isoformat()
+
+    def load_history(self):
+        self.history_counts = {}
+        if USE_HISTORY:
+            with HistoryStore(self.HISTORY_PATH) as store:
+                self.history_counts = store.cumulative_counts(
+                    before=self.get_month_bounds()[0]
+                )
+
+    def record_history(self, schedule):
+        if not USE_HISTORY:
+            return
+        assignments = [
+            (
+                member,
+                datetime(self.YEAR, self.MONTH, self.get_day(date)).date().isoformat(),
+                shift,
+            )
+            for date, shifts in schedule.items()
+            for shift, staff_list in shifts.items()
+            if staff_list
+            for member in staff_list
+        ]
+        with HistoryStore(self.HISTORY_PATH) as store:
+            store.record_month(assignments, *self.get_month_bounds(), venue=self.VENUE)
+
+    def make_snapshot(
+        self, schedule, all_dates, work_dates, all_members, staff_availability
+    ):
+        return {
+            "all_members": all_members,
+            "all_dates": all_dates,
+            "work_dates": work_dates,
+            "schedule": schedule,
+            "staff_availability": staff_availability,
+            "no_reply_members": sorted(self.no_reply_members),
+            "manual_review": self.manual_review,
+            "rng": {"seed": self.rng_streams.seed, "worker": self.rng_streams.worker},
+        }
+
+    def restore_snapshot(self, snapshot):
+        # The calendar state (weekdays, holiday overrides) is not in the
+        # snapshot, so a cache hit has to rebuild it like a fresh solve
+        all_dates = self.build_calendar(
+            {date: self.get_day(date) for date in snapshot["work_dates"]}
+        )
+        self.load_special_dates(all_dates)
+        self.no_reply_members = set(snapshot["no_reply_members"])
+        self.manual_review = snapshot["manual_review"]
+        self.rng_streams = RngStreams(**snapshot["rng"])
+        snapshot["staff_availability"] = {
+            name: [(date, shifts) for date, shifts in availability]
+            for name, availability in snapshot["staff_availability"].items()
+        }
+        return snapshot
+
+    def get_form_header(self, columns):
+        return parse_form_header(
+            columns,
+            self.YEAR,
+            self.MONTH,
+            {self.MONTH_NAME[:3].lower(), MONTH_ABBREVS[self.MONTH]},
+            self.NAME_COLUMN,
+        )
+
+    def select_latest_submissions(self, df):
+        import pandas as pd
+
+        if self.TIMESTAMP_COLUMN in df:
+            stamps = pd.to_datetime(
+                df[self.TIMESTAMP_COLUMN],
+                format=self.TIMESTAMP_FORMAT,
+                errors="coerce",
+            )
+        else:
+            stamps = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+
+        keys = pd.DataFrame(
+            {
+                "name": df[self.NAME_COLUMN]
+                .astype("string")
+                .str.lower()
+                .str.replace(r"[\W_]+", "", regex=True),
+                "stamp": stamps,
+            },
+            index=df.index,
+        )
+        if self.EMAIL_COLUMN in df:
+            keys["email"] = (
+                df[self.EMAIL_COLUMN].astype("string").str.strip().str.lower()
+            )
+
+        # Stable sort keeps file order among equal or missing timestamps, so
+        # the last row per name/email is the latest submission
+        latest = keys.sort_values("stamp", kind="stable", na_position="first")
+        for key in ("name", "email"):
+            if key in latest:
+                has_key = latest[key].notna() & (latest[key] != "")
+                latest = pd.concat(
+                    [
+                        latest[~has_key],
+                        latest[has_key].drop_duplicates(key, keep="last"),
+                    ]
+                )
+
+        return stamps, df.index.isin(latest.index)
+
+    def read_form_chunks(self):
+        import pandas as pd
+
+        if not STREAMING_INGEST:
+            df = pd.read_csv(self.FILEPATH)
+            stamps, keep = self.select_latest_submissions(df)
+            return self.get_form_header(df.columns), stamps, [df[keep]]
+
+        header = self.get_form_header(pd.read_csv(self.FILEPATH, nrows=0).columns)
+        date_cols = header.date_column_names
+        key_cols = [
+            col
+            for col in (self.NAME_COLUMN, self.EMAIL_COLUMN, self.TIMESTAMP_COLUMN)
+            if col in header.columns
+        ]
+        stamps, keep = self.select_latest_submissions(
+            pd.read_csv(self.FILEPATH, usecols=key_cols, dtype="string")
+        )
+
+        dtypes = {col: "category" for col in date_cols}
+        dtypes[self.NAME_COLUMN] = "string"
+        extra_cols = []
+        if self.COMMENT_COLUMN in header.columns:
+            dtypes[self.COMMENT_COLUMN] = "category"
+            extra_cols.append(self.COMMENT_COLUMN)
+        reader = pd.read_csv(
+            self.FILEPATH,
+            usecols=[self.NAME_COLUMN, *extra_cols, *date_cols],
+            dtype=dtypes,
+            chunksize=self.CHUNK_SIZE,
+        )
+        chunks = (chunk[keep[chunk.index]] for chunk in reader)
+        return header, stamps, chunks
+
+    def ingest_availability_chunk(
+        self,
+        chunk,
+        work_dates,
+        date_cols,
+        all_members,
+        staff_availability,
+        responding_members,
+        stamps,
+        submitted_at,
+        comments,
+    ):
+        import pandas as pd
+
+        # Categorical columns only hold a handful of distinct answers, so each
+        # one is parsed once and looked up by code for every row
+        parsed_cols = []
+        for date, col in zip(work_dates, date_cols):
+            values = chunk[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                lookup = [self.parse_shifts(v, date) for v in values.cat.categories]
+                parsed_cols.append(
+                    [lookup[code] if code >= 0 else [] for code in values.cat.codes]
+                )
+            else:
+                parsed_cols.append([self.parse_shifts(v, date) for v in values])
+
+        comment_col = (
+            chunk[self.COMMENT_COLUMN].tolist()
+            if self.COMMENT_COLUMN in chunk
+            else [None] * len(chunk)
+        )
+
+        member_set = set(all_members)
+        for row_idx, (index, input_name) in enumerate(
+            zip(chunk.index, chunk[self.NAME_COLUMN])
+        ):
+            if not isinstance(input_name, str):
+                continue
+            matched_name = self.find_member_match(input_name, all_members)
+            if matched_name in member_set:
+                # Different spellings of one name can still match the same
+                # member, so an older submission must not overwrite a newer one
+                stamp = stamps[index]
+                previous = submitted_at.get(matched_name)
+                if previous is not None and stamp < previous:
+                    continue
+                submitted_at[matched_name] = stamp
+                responding_members.add(matched_name)
+                comment = comment_col[row_idx]
+                if isinstance(comment, str) and comment.strip():
+                    comments[matched_name] = comment
+                else:
+                    comments.pop(matched_name, None)
+                staff_availability[matched_name] = [
+                    (date, list(parsed[row_idx]))
+                    for date, parsed in zip(work_dates, parsed_cols)
+                    if parsed[row_idx]
+                ]
+
+    def load_members(self):
         try:
             with open(self.USERPATH + "members.txt", "r") as f:
-                all_members = [line.strip() for line in f if line.strip()]
+                return [line.strip() for line in f if line.strip()]
         except FileNotFoundError:
             raise FileNotFoundError("Could not find members.txt file")
-        df = pd.read_csv(self.FILEPATH)
 
-        date_cols = [
-            col
-            for col in df.columns
-            if f"{self.MONTH_NAME[:3].lower()} -" in col.lower()
-        ]
-        work_dates = [col.split("[")[-1].split("]")[0].strip() for col in date_cols]
+    def load_availability(self, all_members):
+        header, stamps, chunks = self.read_form_chunks()
+        staff_availability = {}
+        responding_members = set()
+        submitted_at = {}
+        comments = {}
+
+        for chunk in chunks:
+            self.ingest_availability_chunk(
+                chunk,
+                header.work_dates,
+                header.date_column_names,
+                all_members,
+                staff_availability,
+                responding_members,
+                stamps,
+                submitted_at,
+                comments,
+            )
+        self.member_comments = comments
+        return header, staff_availability, responding_members
+
+    def load_availability_stdlib(self, all_members):
+        with open(self.FILEPATH, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = self.get_form_header(next(reader))
+            rows = [row for row in reader if len(row) == len(header.columns)]
+
+        stamps = [None] * len(rows)
+        if self.TIMESTAMP_COLUMN in header.columns:
+            stamp_idx = header.columns.index(self.TIMESTAMP_COLUMN)
+            for row_idx, row in enumerate(rows):
+                try:
+                    stamps[row_idx] = datetime.strptime(
+                        row[stamp_idx], self.TIMESTAMP_FORMAT
+                    )
+                except ValueError:
+                    pass
+
+        # Same rule as select_latest_submissions: stable sort by timestamp,
+        # then keep the last row per normalized name and per e-mail address
+        latest = sorted(
+            range(len(rows)),
+            key=lambda i: (stamps[i] is not None, stamps[i] or datetime.min),
+        )
+        key_columns = [(header.name_index, normalize_name)]
+        if self.EMAIL_COLUMN in header.columns:
+            key_columns.append(
+                (
+                    header.columns.index(self.EMAIL_COLUMN),
+                    lambda email: email.strip().lower(),
+                )
+            )
+        for col_idx, make_key in key_columns:
+            last_row = {make_key(rows[i][col_idx]): i for i in latest}
+            latest = [
+                i
+                for i in latest
+                if not make_key(rows[i][col_idx])
+                or last_row[make_key(rows[i][col_idx])] == i
+            ]
+
+        comment_idx = None
+        if self.COMMENT_COLUMN in header.columns:
+            comment_idx = header.columns.index(self.COMMENT_COLUMN)
+
+        member_set = set(all_members)
+        staff_availability = {}
+        responding_members = set()
+        submitted_at = {}
+        comments = {}
+        for row_idx in sorted(latest):
+            row = rows[row_idx]
+            input_name = row[header.name_index]
+            if not input_name:
+                continue
+            matched_name = self.find_member_match(input_name, all_members)
+            if matched_name not in member_set:
+                continue
 
-        all_dates = []
-        current_date = None
-        for i, date in enumerate(work_dates):
-            if current_date:
-                current_day = int(current_date.split(".")[0])
-                next_day = int(date.split(".")[0])
-                current = datetime(self.YEAR, self.MONTH, current_day)
-                while current.weekday() < 5 and current.day < next_day:
-                    current = current + timedelta(days=1)
-                    if current.day < next_day:
-                        weekend_date = f"{current.day}. {self.MONTH_NAME[:3].lower()}"
-                        all_dates.append(weekend_date)
-            all_dates.append(date)
-            current_date = date
+            stamp = stamps[row_idx]
+            previous = submitted_at.get(matched_name)
+            if previous is not None and stamp is not None and stamp < previous:
+                continue
+            submitted_at[matched_name] = stamp
+            responding_members.add(matched_name)
+            if comment_idx is not None and row[comment_idx].strip():
+                comments[matched_name] = row[comment_idx]
+            else:
+                comments.pop(matched_name, None)
+
+            availability = []
+            for date, col_idx in zip(header.work_dates, header.date_indexes):
+                shifts = self.parse_shifts(row[col_idx], date)
+                if shifts:
+                    availability.append((date, shifts))
+            staff_availability[matched_name] = availability
+
+        self.member_comments = comments
+        return header, staff_availability, responding_members
+
+    def load_special_dates(self, all_dates):
+        from special_dates import (
+            load_overrides,
+            norwegian_holidays,
+            resolve_requirements,
+        )
 
+        shifts = list(self.SHIFT_CONFIG)
+        try:
+            overrides = load_overrides(self.SPECIAL_DATES_PATH, shifts)
+        except FileNotFoundError:
+            overrides = []
+        days = {
+            date: datetime(self.YEAR, self.MONTH, self.get_day(date)).date()
+            for date in all_dates
+            if not self.is_weekend(date)
+        }
+        self.calendar_requirements, self.date_notes = resolve_requirements(
+            days,
+            shifts,
+            self.get_base_requirement,
+            overrides,
+            norwegian_holidays(self.YEAR) if self.PUBLIC_HOLIDAYS else None,
+        )
+        for date, note in self.date_notes.items():
+            print(f"{date}: {note}", file=sys.stderr)
+
+    def init_schedule(self, all_dates):
         schedule = {}
         for date in all_dates:
             if self.is_weekend(date):
                 schedule[date] = {"opening": None, "middle": None, "closing": None}
             else:
                 schedule[date] = {
-                    "opening": [],
-                    "middle": [],
-                    "closing": None if self.is_monday(date) else [],
+                    shift: None if self.is_closed(date, shift) else []
+                    for shift in self.SHIFT_CONFIG
                 }
+        return schedule
 
-        staff_availability = {}
-        responding_members = set()
+    def load_previous_assignments(self):
+        if not USE_HISTORY:
+            return []
+        if self.MONTH == 1:
+            previous_start = datetime(self.YEAR - 1, 12, 1)
+        else:
+            previous_start = datetime(self.YEAR, self.MONTH - 1, 1)
+        with HistoryStore(self.HISTORY_PATH) as store:
+            return store.assignments_between(
+                previous_start.date().isoformat(),
+                self.get_month_bounds()[0],
+                venue=self.VENUE,
+            )
 
-        for _, row in df.iterrows():
-            input_name = row["Navn og etternavn"]
-            matched_name = self.find_member_match(input_name, all_members)
-            if matched_name in all_members:
-                responding_members.add(matched_name)
-                availability = []
-                for date, col in zip(work_dates, date_cols):
-                    shifts = self.parse_shifts(row[col], date)
-                    if shifts:
-                        availability.append((date, shifts))
-                staff_availability[matched_name] = availability
+    def warm_start(self, schedule, work_dates, staff_availability, previous):
+        patterns = {}
+        for member, shift_date, shift in previous:
+            if member not in staff_availability:
+                continue
+            day = datetime.strptime(shift_date, "%Y-%m-%d")
+            patterns.setdefault(member, []).append(
+                (day.weekday(), shift, (day.day - 1) // 7)
+            )
+
+        workdays = [d for d in work_dates if not self.is_weekend(d)]
+        dates_by_weekday = {}
+        for date in workdays:
+            dates_by_weekday.setdefault(self.get_weekday(date), []).append(date)
+
+        placed = 0
+        for member in self.order_by_history(patterns):
+            # The member has to have offered this exact shift again, not just
+            # the day
+            offered = {
+                (date, shift)
+                for date, shifts in staff_availability[member]
+                for shift in shifts
+            }
+            taken = 0
+            for weekday, shift, week in patterns[member]:
+                if taken >= 2:
+                    break
+                # Prefer the same week of the month, then the closest one
+                candidates = sorted(
+                    dates_by_weekday.get(weekday, []),
+                    key=lambda d: abs((self.get_day(d) - 1) // 7 - week),
+                )
+                for date in candidates:
+                    if (
+                        (date, shift) in offered
+                        and shift in self.get_available_shifts(date)
+                        and schedule[date][shift] is not None
+                        and len(schedule[date][shift])
+                        < self.get_staff_requirement(date, shift)
+                        and not self._works_near(schedule, member, date, workdays)
+                    ):
+                        schedule[date][shift].append(member)
+                        taken += 1
+                        placed += 1
+                        break
+
+        print(
+            f"Warm start kept {placed} of {len(previous)} assignments",
+            file=sys.stderr,
+        )
+        return schedule
+
+    def _works_near(self, schedule, staff_name, date, workdays):
+        idx = workdays.index(date)
+        for near in workdays[max(0, idx - 1) : idx + 2]:
+            for staff_list in schedule[near].values():
+                if staff_list is not None and staff_name in staff_list:
+                    return True
+        return False
+
+    def solve_schedule(
+        self,
+        schedule,
+        work_dates,
+        all_dates,
+        staff_availability,
+        all_members,
+        callback=None,
+    ):
+        self.preferences = self.build_preferences(work_dates, staff_availability)
+        if self.WARM_START:
+            self.warm_start(
+                schedule,
+                work_dates,
+                staff_availability,
+                self.load_previous_assignments(),
+            )
+        if self.SOLVER_MODE == "anytime":
+            schedule = self.solve_anytime(
+                schedule,
+                work_dates,
+                all_dates,
+                staff_availability,
+                all_members,
+                callback=callback,
+            )
+        else:
+            self.assign_shifts(
+                schedule, work_dates, staff_availability, all_members, shifts_needed=1
+            )
+            self.assign_shifts(
+                schedule, work_dates, staff_availability, all_members, shifts_needed=2
+            )
+            schedule = self.validate_schedule(schedule, all_dates)
+
+        self.violations = self.find_violations(schedule, staff_availability)
+        if self.violations:
+            from schedule_validator import summarize
+
+            counts = summarize(self.violations)
+            print(
+                "Warning: schedule violations: "
+                + ", ".join(f"{kind}={count}" for kind, count in counts.items()),
+                file=sys.stderr,
+            )
+        return schedule
+
+    def build_preferences(self, work_dates, staff_availability):
+        from preferences import build_preferences
+
+        dates = [date for date in work_dates if not self.is_weekend(date)]
+        return build_preferences(
+            staff_availability,
+            self.member_comments,
+            dates,
+            {date: self.get_weekday(date) for date in dates},
+            list(self.SHIFT_CONFIG),
+            comment_weight=self.PREFERENCE_WEIGHTS["comment"],
+            form_weight=self.PREFERENCE_WEIGHTS["form"],
+        )
+
+    def find_violations(self, schedule, staff_availability):
+        from schedule_validator import find_violations
+
+        requirements = {
+            (date, shift): self.get_staff_requirement(date, shift)
+            for date, shifts in schedule.items()
+            for shift, staff_list in shifts.items()
+            if staff_list is not None
+        }
+        return find_violations(
+            schedule,
+            staff_availability,
+            self.no_reply_members,
+            requirements,
+            {date: self.get_weekday(date) for date in schedule},
+            {date: self.get_day(date) for date in schedule},
+        )
+
+    def analyze_criticality(self, schedule, work_dates, staff_availability):
+        from criticality import analyze_criticality
+
+        # Filler days between form dates have no declared availability, so
+        # they would only show up as unfillable
+        requirements = {
+            (date, shift): self.get_staff_requirement(date, shift)
+            for date in work_dates
+            for shift, staff_list in schedule.get(date, {}).items()
+            if staff_list is not None
+        }
+        return analyze_criticality(schedule, requirements, staff_availability)
+
+    def analyze_availability(self, work_dates, all_members, staff_availability):
+        from analytics import availability_cube, summarize_availability
+
+        # Form dates only: filler days were never offered, so they would all
+        # look short
+        dates = [date for date in work_dates if not self.is_weekend(date)]
+        shifts = list(self.SHIFT_CONFIG)
+        if self.READ_FROM_STORE and dates:
+            cube = self.store_availability_cube(dates, all_members, shifts)
+        else:
+            cube = availability_cube(staff_availability, all_members, dates, shifts)
+        report = summarize_availability(
+            cube,
+            [member not in self.no_reply_members for member in all_members],
+            [self.get_weekday(date) for date in dates],
+            [
+                [self.get_staff_requirement(date, shift) for shift in shifts]
+                for date in dates
+            ],
+        )
+        report["dates"] = dates
+        report["shifts"] = shifts
+        report["offered_nothing"] = [all_members[i] for i in report["offered_nothing"]]
+        report["no_reply"] = [all_members[i] for i in report["no_reply"]]
+        return report
+
+    def get_swap_index(self, snapshot):
+        from swaps import SwapIndex
+
+        schedule = snapshot["schedule"]
+        return SwapIndex(
+            schedule,
+            snapshot["staff_availability"],
+            snapshot["no_reply_members"],
+            {date: self.get_day(date) for date in schedule},
+        )
+
+    def copy_schedule(self, schedule):
+        return {
+            date: {
+                shift: None if staff_list is None else list(staff_list)
+                for shift, staff_list in shifts.items()
+            }
+            for date, shifts in schedule.items()
+        }
+
+    def score_schedule(self, schedule, staff_availability):
+        filled = 0
+        loads = {}
+        for date, shifts in schedule.items():
+            for shift, staff_list in shifts.items():
+                if staff_list is None:
+                    continue
+                filled += min(len(staff_list), self.get_staff_requirement(date, shift))
+                for member in staff_list:
+                    loads[member] = loads.get(member, 0) + 1
+
+        # Coverage first, then how many respondents got a shift, then how well
+        # their preferences were met, then the heaviest individual load
+        with_shift = sum(1 for member in staff_availability if member in loads)
+        preference = (
+            round(self.preferences.score(schedule), 3)
+            if self.preferences is not None
+            else 0.0
+        )
+        return (filled, with_shift, preference, -max(loads.values(), default=0))
+
+    def iter_solutions(
+        self,
+        schedule,
+        work_dates,
+        all_dates,
+        staff_availability,
+        all_members,
+        time_budget=None,
+        max_iterations=None,
+    ):
+        if time_budget is None and max_iterations is None:
+            max_iterations = 1
+
+        # Restart i runs on worker stream i of one root seed, so the winner can
+        # be replayed alone as a greedy run with WORKER = i
+        root = self.rng_streams or self.reset_rng()
+        start = perf_counter()
+        best_score = None
+        iteration = 0
+        while True:
+            # The first restart always runs, so a zero budget still returns a
+            # schedule
+            if iteration and (
+                (max_iterations is not None and iteration >= max_iterations)
+                or (time_budget is not None and perf_counter() - start >= time_budget)
+            ):
+                break
+
+            self.rng_streams = root.spawn(root.worker + iteration)
+            candidate = self.copy_schedule(schedule)
+            self.assign_shifts(
+                candidate, work_dates, staff_availability, all_members, shifts_needed=1
+            )
+            self.assign_shifts(
+                candidate, work_dates, staff_availability, all_members, shifts_needed=2
+            )
+            candidate = self.validate_schedule(candidate, all_dates)
+            iteration += 1
+
+            score = self.score_schedule(candidate, staff_availability)
+            if best_score is None or score > best_score:
+                best_score = score
+                yield {
+                    "iteration": iteration,
+                    "elapsed": perf_counter() - start,
+                    "score": score,
+                    "seed": self.rng_streams.seed,
+                    "worker": self.rng_streams.worker,
+                    "schedule": candidate,
+                }
+
+    def solve_anytime(
+        self,
+        schedule,
+        work_dates,
+        all_dates,
+        staff_availability,
+        all_members,
+        callback=None,
+    ):
+        best = None
+        for progress in self.iter_solutions(
+            schedule,
+            work_dates,
+            all_dates,
+            staff_availability,
+            all_members,
+            time_budget=self.TIME_BUDGET,
+            max_iterations=self.MAX_ITERATIONS,
+        ):
+            best = progress
+            if callback is not None:
+                callback(progress)
+        self.rng_streams = RngStreams(best["seed"], best["worker"])
+        return best["schedule"]
+
+    def get_availability_store(self, read_only=False):
+        from availability_store import AvailabilityStore
+
+        if read_only:
+            # Reading never creates the store, an empty one would solve the
+            # month with no dates
+            if not os.path.exists(self.STORE_PATH):
+                raise FileNotFoundError(
+                    f"Could not find availability store {self.STORE_PATH}"
+                )
+            return AvailabilityStore(self.STORE_PATH, read_only=True)
+        start = datetime(self.YEAR, 1, 1).date()
+        days = (datetime(self.YEAR + 1, 1, 1).date() - start).days
+        return AvailabilityStore.open(
+            self.STORE_PATH, start, days, list(self.SHIFT_CONFIG)
+        )
+
+    def store_availability(self, work_days, staff_availability, responding_members):
+        days_by_label = {
+            date: datetime(self.YEAR, self.MONTH, day).date()
+            for date, day in work_days.items()
+        }
+        with self.get_availability_store() as store:
+            store.record(staff_availability, responding_members, days_by_label)
+
+    def store_availability_cube(self, dates, all_members, shifts):
+        from analytics import store_cube
+
+        # Reads the bits straight from the memory map instead of going through
+        # the per-member lists
+        with self.get_availability_store(read_only=True) as store:
+            columns = [
+                store.day_index(datetime(self.YEAR, self.MONTH, self.get_day(d)).date())
+                for d in dates
+            ]
+            first = min(columns)
+            block = store.view()[:, first : max(columns) + 1]
+            return store_cube(
+                block,
+                [col - first for col in columns],
+                [store.member_ids.get(member, -1) for member in all_members],
+                [store.shift_bits.get(shift, 0) for shift in shifts],
+            )
+
+    def get_store_work_days(self, store):
+        from availability_store import RESPONDED
+
+        first = datetime(self.YEAR, self.MONTH, 1).date()
+        days_in_month = calendar.monthrange(self.YEAR, self.MONTH)[1]
+        answered = store.view(first, None)[:, :days_in_month] & RESPONDED
+        # The month's form dates are the days anyone answered for
+        work_days = {}
+        for offset in answered.any(axis=0).nonzero()[0].tolist():
+            day = offset + 1
+            weekday = calendar.weekday(self.YEAR, self.MONTH, day)
+            label = f"{day}. {MONTH_ABBREVS[self.MONTH]} - {WEEKDAY_NAMES[weekday]}"
+            work_days[label] = day
+        if not work_days:
+            raise ValueError(
+                f"No answers for {self.MONTH_NAME} {self.YEAR} in {self.STORE_PATH}"
+            )
+        return work_days
+
+    def check_availability_store(self):
+        with self.get_availability_store(read_only=True) as store:
+            self.get_store_work_days(store)
+
+    def load_availability_from_store(self, all_members):
+        with self.get_availability_store(read_only=True) as store:
+            work_days = self.get_store_work_days(store)
+            staff_availability, responding_members = store.read(
+                {
+                    label: datetime(self.YEAR, self.MONTH, day).date()
+                    for label, day in work_days.items()
+                },
+                members=all_members,
+            )
+        return work_days, staff_availability, responding_members
 
+    def prepare_schedule(self, all_members, stdlib=False, from_store=False):
+        if from_store:
+            work_days, staff_availability, responding_members = (
+                self.load_availability_from_store(all_members)
+            )
+        else:
+            if stdlib:
+                header, staff_availability, responding_members = (
+                    self.load_availability_stdlib(all_members)
+                )
+            else:
+                header, staff_availability, responding_members = self.load_availability(
+                    all_members
+                )
+            work_days = {date: header.day_by_label[date] for date in header.work_dates}
+            if AVAILABILITY_STORE:
+                self.store_availability(
+                    work_days, staff_availability, responding_members
+                )
+        work_dates = list(work_days)
+        all_dates = self.build_calendar(work_days)
+        self.load_special_dates(all_dates)
         self.no_reply_members = set(all_members) - responding_members
+        return work_dates, all_dates, self.init_schedule(all_dates), staff_availability
 
-        self.assign_shifts(
-            schedule, work_dates, staff_availability, all_members, shifts_needed=1
+    def create_schedule(self, bypass_cache=False, compare_to=None, callback=None):
+        members_path = self.USERPATH + "members.txt"
+        print(members_path)
+        print("/Users/martin/Desktop/bar-scheduler/members.txt")
+        all_members = self.load_members()
+        self.load_history()
+        if self.READ_FROM_STORE:
+            # Fail before the cache, the history or any output is touched
+            self.check_availability_store()
+
+        save_path = (
+            f"{self.USERPATH}{self.MONTH_NAME.lower()}_schedule_{self.YEAR}.xlsx"
+        )
+
+        previous_schedule = None
+        if compare_to is not None:
+            previous_schedule = load_schedule(compare_to)
+
+        cache = None
+        if USE_CACHE and not bypass_cache and compare_to is None:
+            cache = ScheduleCache(self.CACHE_DIR, self.CACHE_MAX_BYTES)
+            input_paths = [
+                self.STORE_PATH if self.READ_FROM_STORE else self.FILEPATH,
+                members_path,
+            ]
+            if os.path.exists(self.SPECIAL_DATES_PATH):
+                input_paths.append(self.SPECIAL_DATES_PATH)
+            cache_key = cache.make_key(
+                input_paths,
+                self.get_cache_config(),
+                self.SEED,
+                self.SOLVER_MODE,
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                snapshot, workbook = cached
+                print(f"Cache hit, saving schedule to: {save_path}")
+                with open(save_path, "wb") as f:
+                    f.write(workbook)
+                with open(save_path[:-5] + ".json", "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                self.record_history(snapshot["schedule"])
+                return self.restore_snapshot(snapshot)
+
+        self.reset_rng()
+
+        work_dates, all_dates, schedule, staff_availability = self.prepare_schedule(
+            all_members, from_store=self.READ_FROM_STORE
+        )
+        schedule = self.solve_schedule(
+            schedule,
+            work_dates,
+            all_dates,
+            staff_availability,
+            all_members,
+            callback=callback,
+        )
+        self.record_history(schedule)
+
+        wb = self.build_workbook(
+            schedule, all_dates, work_dates, all_members, staff_availability
+        )
+        snapshot = self.make_snapshot(
+            schedule, all_dates, work_dates, all_members, staff_availability
+        )
+
+        if self.CRITICALITY:
+            report = self.analyze_criticality(schedule, work_dates, staff_availability)
+            self.add_criticality_sheet(wb, report)
+            critical = [m for m in report["members"] if m["coverage_lost"]]
+            print(
+                f"{len(critical)} member(s) cannot be replaced in full, "
+                f"coverage {report['max_coverage']}/{report['required']}"
+            )
+
+        if previous_schedule is not None:
+            changes = diff_schedules(previous_schedule, schedule)
+            self.add_changes_sheet(wb, changes)
+            changes_path = save_path.replace("_schedule_", "_changes_")[:-5] + ".json"
+            print(
+                f"{changes['added']} added, {changes['removed']} removed, "
+                f"saving changes to: {changes_path}"
+            )
+            with open(changes_path, "w", encoding="utf-8") as f:
+                json.dump(changes, f, ensure_ascii=False, indent=2)
+
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        print(f"Saving schedule to: {save_path}")
+        with open(save_path, "wb") as f:
+            f.write(buffer.getvalue())
+        with open(save_path[:-5] + ".json", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+
+        if cache is not None:
+            cache.put(cache_key, snapshot, buffer.getvalue())
+
+        return snapshot
+
+    def check_schedule(self, output_format="text"):
+        all_members = self.load_members()
+        self.load_history()
+        self.reset_rng()
+
+        work_dates, all_dates, schedule, staff_availability = self.prepare_schedule(
+            all_members, stdlib=True, from_store=self.READ_FROM_STORE
+        )
+        schedule = self.solve_schedule(
+            schedule, work_dates, all_dates, staff_availability, all_members
         )
-        self.assign_shifts(
-            schedule, work_dates, staff_availability, all_members, shifts_needed=2
+        snapshot = self.make_snapshot(
+            schedule, all_dates, work_dates, all_members, staff_availability
         )
 
-        schedule = self.validate_schedule(schedule, all_dates)
+        if output_format == "json":
+            return json.dumps(snapshot, ensure_ascii=False, indent=2)
+        return self.format_schedule_text(snapshot)
+
+    def watch_form(self, interval=60.0, callback=None):
+        from form_watch import FormWatcher
+
+        watcher = FormWatcher(self)
+        last_seen = None
+        while True:
+            stat = os.stat(self.FILEPATH)
+            if (stat.st_size, stat.st_mtime_ns) != last_seen:
+                last_seen = (stat.st_size, stat.st_mtime_ns)
+                start = perf_counter()
+                new_rows, updated = watcher.poll()
+                staff_availability, responding_members, comments = (
+                    watcher.availability()
+                )
+                self.member_comments = comments
+                self.no_reply_members = set(watcher.all_members) - responding_members
+                coverage = watcher.coverage()
+                if callback is not None:
+                    callback(new_rows, updated, coverage)
+                else:
+                    print(
+                        f"{new_rows} new row(s), {len(updated)} member(s) updated "
+                        f"in {perf_counter() - start:.3f}s: "
+                        f"{coverage['responded']}/{coverage['members']} responded, "
+                        f"coverage {coverage['covered']}/{coverage['required']}"
+                    )
+                    for (date, shift), (supply, required) in coverage["short"].items():
+                        print(
+                            f"  {date} {shift}: {supply} available, {required} needed"
+                        )
+            if not interval:
+                return staff_availability
+            sleep(interval)
+
+    def format_schedule_text(self, snapshot):
+        lines = []
+        seen = set()
+        duplicates = []
+        for member in snapshot["all_members"]:
+            if member.lower() in seen:
+                duplicates.append(member)
+            seen.add(member.lower())
+        if duplicates:
+            lines.append(f"Duplicate members: {', '.join(duplicates)}")
+
+        schedule = snapshot["schedule"]
+        for date in snapshot["all_dates"]:
+            if self.is_weekend(date):
+                continue
+            lines.append(date)
+            for shift, staff_list in schedule[date].items():
+                if staff_list is None:
+                    continue
+                required = self.get_staff_requirement(date, shift)
+                lines.append(
+                    f"  {shift:<8} {len(staff_list)}/{required}  {', '.join(staff_list)}"
+                )
+
+        lines.append(f"No reply: {len(snapshot['no_reply_members'])}")
+        for review in snapshot["manual_review"]:
+            lines.append(
+                f"Review: {review['input_name']} -> {review['possible_match']} "
+                f"({review['confidence']})"
+            )
+        return "\n".join(lines)
+
+    def compare_schedules(self, old_path, new_path):
+        return diff_schedules(load_schedule(old_path), load_schedule(new_path))
+
+    def add_changes_sheet(self, wb, changes):
+        from openpyxl.styles import Alignment
+
+        styles = self.get_excel_styles()
+        ws = wb.create_sheet("Changes")
+
+        def write_header(row, titles):
+            for col, title in enumerate(titles, 1):
+                cell = ws.cell(row=row, column=col, value=title)
+                cell.fill = styles["header"]["fill"]
+                cell.font = styles["header"]["font"]
+                cell.border = styles["thin_border"]
+
+        def format_slots(slots):
+            return "\n".join(f"{date} {shift}" for date, shift in slots)
+
+        write_header(1, ["Name", "Added", "Removed", "Old Shifts", "New Shifts"])
+        row = 2
+        for member, member_changes in changes["members"].items():
+            ws.cell(row=row, column=1, value=member)
+            ws.cell(row=row, column=2, value=format_slots(member_changes["added"]))
+            ws.cell(row=row, column=3, value=format_slots(member_changes["removed"]))
+            ws.cell(row=row, column=4, value=member_changes["old_shifts"])
+            ws.cell(row=row, column=5, value=member_changes["new_shifts"])
+            row += 1
+
+        row += 1
+        write_header(
+            row, ["Date", "Shift", "Added", "Removed", "Old Count", "New Count"]
+        )
+        for slot in changes["slots"]:
+            row += 1
+            ws.cell(row=row, column=1, value=slot["date"])
+            ws.cell(row=row, column=2, value=slot["shift"])
+            ws.cell(row=row, column=3, value=", ".join(slot["added"]))
+            ws.cell(row=row, column=4, value=", ".join(slot["removed"]))
+            ws.cell(row=row, column=5, value=slot["old_count"])
+            ws.cell(row=row, column=6, value=slot["new_count"])
+
+        for row_cells in ws.iter_rows(min_row=2):
+            for cell in row_cells:
+                cell.alignment = Alignment(vertical="top", wrap_text=True)
+        ws.column_dimensions["A"].width = 30
+        for col in "BCD":
+            ws.column_dimensions[col].width = 30
+
+    def add_criticality_sheet(self, wb, report):
+        from openpyxl.styles import Alignment
+
+        styles = self.get_excel_styles()
+        ws = wb.create_sheet("Criticality")
+
+        titles = ["Name", "Shifts", "Coverage Lost", "Unfillable Slots", "Reshuffles"]
+        for col, title in enumerate(titles, 1):
+            cell = ws.cell(row=1, column=col, value=title)
+            cell.fill = styles["header"]["fill"]
+            cell.font = styles["header"]["font"]
+            cell.border = styles["thin_border"]
+
+        for row, entry in enumerate(report["members"], 2):
+            ws.cell(row=row, column=1, value=entry["member"])
+            ws.cell(row=row, column=2, value=entry["shifts"])
+            ws.cell(row=row, column=3, value=entry["coverage_lost"])
+            ws.cell(
+                row=row,
+                column=4,
+                value="\n".join(
+                    f"{date} {shift}" for date, shift in entry["unfillable"]
+                ),
+            )
+            ws.cell(row=row, column=5, value=entry["reshuffles"])
+
+        for row_cells in ws.iter_rows(min_row=2):
+            for cell in row_cells:
+                cell.alignment = Alignment(vertical="top", wrap_text=True)
+        ws.column_dimensions["A"].width = 30
+        ws.column_dimensions["D"].width = 30
+
+    def add_analytics_sheet(self, wb, report):
+        from openpyxl.styles import Alignment, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        styles = self.get_excel_styles()
+        short_fill = PatternFill(
+            start_color="F4CCCC", end_color="F4CCCC", fill_type="solid"
+        )
+        ws = wb.create_sheet("Analytics")
+        shifts = report["shifts"]
+
+        def write_header(row, titles):
+            for col, title in enumerate(titles, 1):
+                cell = ws.cell(row=row, column=col, value=title)
+                cell.fill = styles["header"]["fill"]
+                cell.font = styles["header"]["font"]
+                cell.border = styles["thin_border"]
+                cell.alignment = Alignment(horizontal="center", wrap_text=True)
+
+        members, responded = report["members"], report["responded"]
+        write_header(1, ["Members", "Responded", "No Reply", "Response Rate"])
+        ws.cell(row=2, column=1, value=members)
+        ws.cell(row=2, column=2, value=responded)
+        ws.cell(row=2, column=3, value=members - responded)
+        rate = ws.cell(row=2, column=4, value=responded / members if members else 0)
+        rate.number_format = "0.0%"
+
+        row = 4
+        write_header(
+            row,
+            ["Weekday", "Dates"]
+            + [f"{shift.capitalize()} Offers" for shift in shifts]
+            + ["Offers per Date"],
+        )
+        for weekday, name in enumerate(WEEKDAY_NAMES):
+            n_dates = int(report["weekday_dates"][weekday])
+            if not n_dates:
+                continue
+            row += 1
+            offers = report["weekday_supply"][weekday].tolist()
+            ws.cell(row=row, column=1, value=name.capitalize())
+            ws.cell(row=row, column=2, value=n_dates)
+            for col, count in enumerate(offers, 3):
+                ws.cell(row=row, column=col, value=count)
+            per_date = ws.cell(
+                row=row, column=len(shifts) + 3, value=sum(offers) / n_dates
+            )
+            per_date.number_format = "0.0"
+
+        row += 2
+        write_header(
+            row,
+            ["Date", "Available"]
+            + [
+                f"{shift.capitalize()} {what}"
+                for shift in shifts
+                for what in ("Supply", "Demand")
+            ],
+        )
+        supply, demand = report["supply"].tolist(), report["demand"].tolist()
+        for idx, date in enumerate(report["dates"]):
+            row += 1
+            ws.cell(row=row, column=1, value=date)
+            ws.cell(row=row, column=2, value=int(report["available"][idx]))
+            for shift_idx in range(len(shifts)):
+                col = 3 + 2 * shift_idx
+                supply_cell = ws.cell(row=row, column=col, value=supply[idx][shift_idx])
+                ws.cell(row=row, column=col + 1, value=demand[idx][shift_idx])
+                if supply[idx][shift_idx] < demand[idx][shift_idx]:
+                    supply_cell.fill = short_fill
+
+        row += 2
+        write_header(row, ["Days Offered", "Members"])
+        for days, count in enumerate(report["days_offered"].tolist()):
+            if count:
+                row += 1
+                ws.cell(row=row, column=1, value=days)
+                ws.cell(row=row, column=2, value=count)
+
+        row += 2
+        write_header(row, ["Offered Nothing", "Status"])
+        for names, status in (
+            (report["offered_nothing"], "answered, no days"),
+            (report["no_reply"], "no reply"),
+        ):
+            for name in names:
+                row += 1
+                ws.cell(row=row, column=1, value=name)
+                ws.cell(row=row, column=2, value=status)
+
+        ws.column_dimensions["A"].width = 30
+        for col in range(2, 2 * len(shifts) + 3):
+            ws.column_dimensions[get_column_letter(col)].width = 14
+
+    def simulate_no_shows(self, snapshot, scenarios=10000, no_show_rate=0.1, seed=None):
+        from robustness import simulate_no_shows
+
+        report = simulate_no_shows(
+            snapshot["schedule"],
+            snapshot["work_dates"],
+            snapshot["staff_availability"],
+            get_requirement=self.get_staff_requirement,
+            scenarios=scenarios,
+            no_show_rate=no_show_rate,
+            seed=self.rng_streams.sequence("simulation") if seed is None else seed,
+        )
+
+        save_path = (
+            f"{self.USERPATH}{self.MONTH_NAME.lower()}_robustness_{self.YEAR}.json"
+        )
+        print(f"Saving no-show simulation to: {save_path}")
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        risky = sorted(report["slots"], key=lambda slot: -slot["failure_probability"])
+        for slot in risky[:5]:
+            print(
+                f"{slot['date']} {slot['shift']}: "
+                f"{slot['failure_probability']:.1%} chance of being short, "
+                f"{slot['standbys']} standby(s)"
+            )
+        return report
+
+    def export_ics(self, schedule, out_dir=None, combined=False):
+        if out_dir is None:
+            out_dir = f"{self.USERPATH}{self.MONTH_NAME.lower()}_ics_{self.YEAR}/"
+        exporter = IcsExporter(
+            self.SHIFT_CONFIG,
+            lambda date: datetime(self.YEAR, self.MONTH, self.get_day(date)).date(),
+            f"{self.MONTH_NAME} {self.YEAR}",
+        )
+        paths = exporter.export(schedule, out_dir, combined)
+        print(f"Wrote {len(paths)} calendar file(s) to: {out_dir}")
+        return paths
+
+    def build_workbook(
+        self, schedule, all_dates, work_dates, all_members, staff_availability
+    ):
+        from openpyxl import Workbook
+        from openpyxl.comments import Comment
+        from openpyxl.styles import Font, PatternFill
 
         wb = Workbook()
         ws = wb.active
@@ -475,6 +1730,8 @@ class BarScheduler:
                     end_color=self.weekend_color,
                     fill_type="solid",
                 )
+            if date in self.date_notes:
+                cell.comment = Comment(self.date_notes[date], "bar-scheduler")
 
         for row_idx, name in enumerate(all_members, 2):
             cell = ws.cell(row=row_idx, column=1, value=name)
@@ -500,34 +1757,13 @@ class BarScheduler:
                         fill_type="solid",
                     )
                 else:
-                    if self.is_monday(date):
-                        for shift, staff_list in schedule[date].items():
-                            if (
-                                shift != "closing"
-                                and staff_list is not None
-                                and name in staff_list
-                            ):
-                                cell.fill = PatternFill(
-                                    start_color=self.SHIFT_CONFIG[shift]["color"],
-                                    end_color=self.SHIFT_CONFIG[shift]["color"],
-                                    fill_type="solid",
-                                )
-                    else:
-                        for shift, staff_list in schedule[date].items():
-                            if staff_list is not None and name in staff_list:
-                                cell.fill = PatternFill(
-                                    start_color=self.SHIFT_CONFIG[shift]["color"],
-                                    end_color=self.SHIFT_CONFIG[shift]["color"],
-                                    fill_type="solid",
-                                )
-
-        for date in all_dates:
-            if self.is_monday(date):
-                col_idx = all_dates.index(date) + 2
-                for row_idx in range(2, len(all_members) + 2):
-                    cell = ws.cell(row=row_idx, column=col_idx)
-                    if cell.fill.start_color.index == "C6FFB4":
-                        cell.fill = PatternFill(fill_type=None)
+                    for shift, staff_list in schedule[date].items():
+                        if staff_list is not None and name in staff_list:
+                            cell.fill = PatternFill(
+                                start_color=self.SHIFT_CONFIG[shift]["color"],
+                                end_color=self.SHIFT_CONFIG[shift]["color"],
+                                fill_type="solid",
+                            )
 
         staff_shifts = {member: 0 for member in all_members}
         for date in all_dates:
@@ -602,17 +1838,144 @@ class BarScheduler:
                 ws.cell(row=sum_row + 3, column=col_idx, value=closing_count)
 
         self.apply_excel_formatting(ws, all_dates, all_members)
-
-        save_path = (
-            f"{self.USERPATH}{self.MONTH_NAME.lower()}_schedule_{self.YEAR}.xlsx"
+        self.add_analytics_sheet(
+            wb, self.analyze_availability(work_dates, all_members, staff_availability)
         )
-        print(f"Saving schedule to: {save_path}")
-        wb.save(save_path)
+
+        return wb
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--check",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="solve without pandas/openpyxl and print the schedule",
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--ics",
+        nargs="?",
+        const="members",
+        choices=["members", "combined"],
+        help="also write iCalendar files, one per member or one combined feed",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="SNAPSHOT",
+        help="previous schedule .json to diff the new schedule against",
+    )
+    parser.add_argument(
+        "--diff",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="print the changes between two saved schedule .json files",
+    )
+    parser.add_argument(
+        "--simulate",
+        nargs="?",
+        const=10000,
+        type=int,
+        metavar="SCENARIOS",
+        help="run a Monte Carlo no-show simulation on the new schedule",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="keep last month's weekday/shift pattern where it is still feasible",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        metavar="SECONDS",
+        help="keep improving the schedule until the time budget runs out",
+    )
+    parser.add_argument("--iterations", type=int, help="stop after N solver restarts")
+    parser.add_argument(
+        "--from-store",
+        action="store_true",
+        help="solve from the availability store instead of re-reading the CSV",
+    )
+    parser.add_argument(
+        "--replay",
+        nargs=2,
+        type=int,
+        metavar=("SEED", "WORKER"),
+        help="re-run one solver restart exactly, e.g. the winner of a --budget run",
+    )
+    parser.add_argument(
+        "--venue",
+        nargs=3,
+        action="append",
+        metavar=("NAME", "DIR", "CSV"),
+        help="schedule several venues jointly; DIR holds that venue's members.txt",
+    )
+    parser.add_argument(
+        "--watch",
+        nargs="?",
+        const=60.0,
+        type=float,
+        metavar="SECONDS",
+        help="follow the form export and report coverage as answers arrive; "
+        "0 checks once",
+    )
+    args = parser.parse_args()
+
     scheduler = BarScheduler()
-    scheduler.create_schedule()
+    if args.budget is not None or args.iterations is not None:
+        scheduler.SOLVER_MODE = "anytime"
+        scheduler.TIME_BUDGET = args.budget
+        scheduler.MAX_ITERATIONS = args.iterations
+    if args.warm_start:
+        scheduler.WARM_START = True
+    if args.from_store:
+        scheduler.READ_FROM_STORE = True
+    if args.replay:
+        scheduler.SEED, scheduler.WORKER = args.replay
+        scheduler.SOLVER_MODE = "greedy"
+    if args.diff:
+        changes = scheduler.compare_schedules(*args.diff)
+        print(json.dumps(changes, ensure_ascii=False, indent=2))
+        return
+    if args.check:
+        print(scheduler.check_schedule(args.check))
+        return
+    if args.watch is not None:
+        try:
+            scheduler.watch_form(args.watch)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.venue:
+        from multi_venue import MultiVenueScheduler
+
+        schedulers = {}
+        for name, userpath, filepath in args.venue:
+            venue_scheduler = BarScheduler()
+            venue_scheduler.USERPATH = userpath.rstrip("/") + "/"
+            venue_scheduler.FILEPATH = filepath
+            venue_scheduler.HISTORY_PATH = venue_scheduler.USERPATH + "history.sqlite3"
+            venue_scheduler.VENUE = name
+            schedulers[name] = venue_scheduler
+        result = MultiVenueScheduler(schedulers, seed=SEED).create_schedules()
+        for conflict in result["conflicts"]:
+            print(json.dumps(conflict, ensure_ascii=False))
+        return
+    snapshot = scheduler.create_schedule(
+        bypass_cache=args.no_cache,
+        compare_to=args.compare,
+        callback=lambda progress: print(
+            f"Iteration {progress['iteration']} "
+            f"({progress['elapsed']:.2f}s): score {progress['score']}, "
+            f"replay with --replay {progress['seed']} {progress['worker']}"
+        ),
+    )
+    if args.simulate:
+        scheduler.simulate_no_shows(snapshot, scenarios=args.simulate)
+    if args.ics:
+        scheduler.export_ics(snapshot["schedule"], combined=args.ics == "combined")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+from collections import deque
+
+
+class CoverageMatching:
+    def __init__(self, requirements, eligible, capacity):
+        self.requirements = requirements
+        self.capacity = capacity
+        self.assigned = {member: set() for member in eligible}
+        # Every augmenting path ends in someone with room for one more shift
+        self.spare = {member for member in eligible if capacity[member] > 0}
+        self.filled = {slot: set() for slot in requirements}
+        self.candidates = {slot: [] for slot in requirements}
+        for member, slots in eligible.items():
+            for slot in slots:
+                if slot in self.candidates:
+                    self.candidates[slot].append(member)
+
+    def add(self, member, slot):
+        self.assigned[member].add(slot)
+        self.filled[slot].add(member)
+        if len(self.assigned[member]) >= self.capacity[member]:
+            self.spare.discard(member)
+
+    def remove(self, member, slot):
+        self.assigned[member].discard(slot)
+        self.filled[slot].discard(member)
+        if len(self.assigned[member]) < self.capacity[member]:
+            self.spare.add(member)
+
+    def seed(self, schedule):
+        for date, shifts in schedule.items():
+            for shift, staff_list in shifts.items():
+                slot = (date, shift)
+                if slot not in self.filled:
+                    continue
+                for member in staff_list or ():
+                    if (
+                        member in self.assigned
+                        and len(self.filled[slot]) < self.requirements[slot]
+                        and len(self.assigned[member]) < self.capacity[member]
+                        and self.same_day(member, slot) is None
+                    ):
+                        self.add(member, slot)
+
+    def same_day(self, member, slot):
+        for other in self.assigned[member]:
+            if other[0] == slot[0]:
+                return other
+        return None
+
+    def augment(self, target, banned=None):
+        # Breadth-first search for an alternating path that ends in a member
+        # with room to spare; every hop moves one person one slot closer to
+        # the slot that needs filling
+        if len(self.spare) <= (banned in self.spare):
+            return None
+        parent = {target: None}
+        seen_days = set()
+        seen_members = set()
+        queue = deque([target])
+        while queue:
+            slot = queue.popleft()
+            for member in self.candidates[slot]:
+                if member == banned or member in self.filled[slot]:
+                    continue
+                if (member, slot[0]) in seen_days:
+                    continue
+                seen_days.add((member, slot[0]))
+                clash = self.same_day(member, slot)
+                if clash is not None:
+                    leaving = [clash]
+                elif member in seen_members:
+                    continue
+                elif len(self.assigned[member]) < self.capacity[member]:
+                    moves = [(member, None, slot)]
+                    while parent[slot] is not None:
+                        mover, into = parent[slot]
+                        moves.append((mover, slot, into))
+                        slot = into
+                    self.apply(moves)
+                    return moves
+                else:
+                    seen_members.add(member)
+                    leaving = list(self.assigned[member])
+                for other in leaving:
+                    if other not in parent:
+                        parent[other] = (member, slot)
+                        queue.append(other)
+        return None
+
+    def apply(self, moves):
+        for member, source, dest in moves:
+            if source is not None:
+                self.remove(member, source)
+            self.add(member, dest)
+
+    def undo(self, moves):
+        for member, source, dest in reversed(moves):
+            self.remove(member, dest)
+            if source is not None:
+                self.add(member, source)
+
+    def fill(self):
+        for slot, required in self.requirements.items():
+            while len(self.filled[slot]) < required:
+                if self.augment(slot) is None:
+                    break
+
+    def shortfall(self):
+        return sum(
+            required - len(self.filled[slot])
+            for slot, required in self.requirements.items()
+        )
+
+
+def analyze_criticality(schedule, requirements, staff_availability, capacity=2):
+    eligible = {}
+    for member, availability in staff_availability.items():
+        eligible[member] = {
+            (date, shift)
+            for date, shifts in availability
+            for shift in shifts
+            if (date, shift) in requirements
+        }
+    # Whoever already holds a slot can keep it, declared or not, which is the
+    # only way a no-reply member enters the analysis
+    loads = {}
+    for date, shifts in schedule.items():
+        for shift, staff_list in shifts.items():
+            for member in staff_list or ():
+                eligible.setdefault(member, set()).add((date, shift))
+                loads[member] = loads.get(member, 0) + 1
+
+    matching = CoverageMatching(
+        requirements,
+        eligible,
+        {member: max(capacity, loads.get(member, 0)) for member in eligible},
+    )
+    matching.seed(schedule)
+    matching.fill()
+    baseline_short = matching.shortfall()
+
+    report = []
+    for member in eligible:
+        held = sorted(matching.assigned[member])
+        if not held:
+            continue
+        for slot in held:
+            matching.remove(member, slot)
+
+        repairs = []
+        unfillable = []
+        for slot in held:
+            moves = matching.augment(slot, banned=member)
+            if moves is None:
+                unfillable.append(slot)
+            else:
+                repairs.append(moves)
+
+        for moves in reversed(repairs):
+            matching.undo(moves)
+        for slot in held:
+            matching.add(member, slot)
+
+        report.append(
+            {
+                "member": member,
+                "shifts": len(held),
+                "coverage_lost": len(unfillable),
+                "unfillable": [list(slot) for slot in unfillable],
+                "reshuffles": sum(len(moves) - 1 for moves in repairs),
+            }
+        )
+
+    report.sort(key=lambda entry: (-entry["coverage_lost"], -entry["shifts"]))
+    return {
+        "required": sum(requirements.values()),
+        "max_coverage": sum(requirements.values()) - baseline_short,
+        "members": report,
+    }
@@ -0,0 +1,122 @@
+import re
+from calendar import monthrange
+from datetime import date
+from functools import lru_cache
+
+NAME = "name"
+DATE = "date"
+MORNING = "morning"
+IGNORED = "ignored"
+
+MONTH_ABBREVS = {
+    1: "jan",
+    2: "feb",
+    3: "mar",
+    4: "apr",
+    5: "mai",
+    6: "jun",
+    7: "jul",
+    8: "aug",
+    9: "sep",
+    10: "okt",
+    11: "nov",
+    12: "des",
+}
+WEEKDAY_NAMES = ["mandag", "tirsdag", "onsdag", "torsdag", "fredag", "lørdag", "søndag"]
+
+DATE_PATTERN = re.compile(r"(\d{1,2})\.\s*([a-zæøå]+)(?:\s*-\s*([a-zæøå]+))?", re.I)
+
+
+class FormHeader:
+    def __init__(self, columns, year, month, month_abbrevs, name_column):
+        self.columns = list(columns)
+        self.year = year
+        self.month = month
+        self.kinds = []
+        self.days = []
+        self.labels = []
+        self.name_index = None
+        self.date_columns = {}
+        self.morning_columns = {}
+
+        days_in_month = monthrange(year, month)[1]
+        for idx, col in enumerate(self.columns):
+            kind, day, label = self._classify(
+                col, month_abbrevs, name_column, days_in_month
+            )
+            if kind == NAME:
+                self.name_index = idx
+            elif kind in (DATE, MORNING):
+                by_day = self.date_columns if kind == DATE else self.morning_columns
+                if day in by_day:
+                    raise ValueError(f"Duplicate {kind} column for day {day}: {col}")
+                by_day[day] = idx
+            self.kinds.append(kind)
+            self.days.append(day)
+            self.labels.append(label)
+
+        if self.name_index is None:
+            raise ValueError(f"Missing name column: {name_column}")
+
+        self.day_by_label = {
+            self.labels[idx]: day
+            for by_day in (self.date_columns, self.morning_columns)
+            for day, idx in by_day.items()
+        }
+
+    def _classify(self, col, month_abbrevs, name_column, days_in_month):
+        if col == name_column:
+            return NAME, None, col
+
+        label = col.split("[")[-1].split("]")[0].strip()
+        match = DATE_PATTERN.search(label)
+        if match is None or match.group(2).lower() not in month_abbrevs:
+            return IGNORED, None, col
+
+        day = int(match.group(1))
+        if not 1 <= day <= days_in_month:
+            raise ValueError(
+                f"Column '{col}' is not a date in {self.month}/{self.year}"
+            )
+
+        if "morgenvakt" in col.lower():
+            return MORNING, day, f"{day}. {match.group(2)}"
+
+        weekday_name = match.group(3)
+        if weekday_name is None:
+            return IGNORED, None, col
+
+        actual = WEEKDAY_NAMES[date(self.year, self.month, day).weekday()]
+        if weekday_name.lower() != actual:
+            raise ValueError(
+                f"Column '{col}' says {weekday_name}, but {day}.{self.month}."
+                f"{self.year} is a {actual}"
+            )
+        return DATE, day, label
+
+    @property
+    def date_indexes(self):
+        return list(self.date_columns.values())
+
+    @property
+    def date_column_names(self):
+        return [self.columns[idx] for idx in self.date_indexes]
+
+    @property
+    def work_dates(self):
+        return [self.labels[idx] for idx in self.date_indexes]
+
+    @property
+    def morning_dates(self):
+        return {self.labels[idx] for idx in self.morning_columns.values()}
+
+
+@lru_cache(maxsize=32)
+def _parse_form_header(columns, year, month, month_abbrevs, name_column):
+    return FormHeader(columns, year, month, month_abbrevs, name_column)
+
+
+def parse_form_header(columns, year, month, month_abbrevs, name_column):
+    return _parse_form_header(
+        tuple(columns), year, month, tuple(month_abbrevs), name_column
+    )
@@ -0,0 +1,362 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+
+from name_index import normalize_name
+
+STATE_VERSION = 1
+# Bytes hashed at the start of the file and just before the last offset; if
+# both still match, the export only grew and the new rows start at the offset
+PROBE = 4096
+ROW_FIELDS = ("id", "stamp", "name", "email", "member", "availability", "comment")
+
+
+def probe_hash(f, start, end):
+    f.seek(start)
+    return hashlib.sha1(f.read(end - start)).hexdigest()
+
+
+def rank(row):
+    # Same order as select_latest_submissions: missing stamps first, then by
+    # time, ties in file order
+    return (row["stamp"] is not None, row["stamp"] or "", row["id"])
+
+
+class FormWatcher:
+    def __init__(self, scheduler, state_path=None):
+        self.scheduler = scheduler
+        self.state_path = state_path or (
+            f"{scheduler.USERPATH}{scheduler.MONTH_NAME.lower()}_watch_"
+            f"{scheduler.YEAR}.json"
+        )
+        # Parsed rows are appended here, one JSON object per line, so a run
+        # only ever writes the rows it added
+        self.rows_path = self.state_path[:-5] + "_rows.jsonl"
+        self.all_members = scheduler.load_members()
+        self.member_set = set(self.all_members)
+        self.members_hash = hashlib.sha1(
+            "\n".join(self.all_members).encode("utf-8")
+        ).hexdigest()
+
+        self.state = None
+        self.header = None
+        self.stamp_index = None
+        self.requirements = {}
+        self.reset()
+
+    def reset(self):
+        self.rows = []
+        self.saved_rows = 0
+        self.by_name = {}
+        self.by_email = {}
+        self.by_member = {}
+        self.winner = {}
+        self.supply = {}
+
+    def fresh_state(self):
+        return {
+            "version": STATE_VERSION,
+            "members_hash": self.members_hash,
+            "columns": None,
+            "offset": 0,
+            "head_hash": None,
+            "tail_hash": None,
+            "last_stamp": None,
+            "n_rows": 0,
+            "rows_bytes": 0,
+            "manual_review": [],
+        }
+
+    def load_state(self):
+        self.state = self.fresh_state()
+        self.reset()
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("members_hash") != self.members_hash
+        ):
+            return
+
+        rows = []
+        if state["n_rows"] and os.path.exists(self.rows_path):
+            with open(self.rows_path, "r", encoding="utf-8") as f:
+                for line, _ in zip(f, range(state["n_rows"])):
+                    rows.append(json.loads(line))
+        if len(rows) != state["n_rows"]:
+            return
+
+        self.state = state
+        self.scheduler.manual_review = list(state["manual_review"])
+        self.set_header(state["columns"])
+        self.add_rows(rows)
+        self.saved_rows = len(rows)
+
+    def save_state(self):
+        with open(self.rows_path, "ab") as f:
+            # Anything past rows_bytes is from a run that stopped before the
+            # state below was written
+            f.truncate(self.state["rows_bytes"])
+            for row in self.rows[self.saved_rows :]:
+                line = json.dumps(
+                    {field: row[field] for field in ROW_FIELDS}, ensure_ascii=False
+                )
+                f.write(line.encode("utf-8") + b"\n")
+            self.state["rows_bytes"] = f.tell()
+        self.saved_rows = len(self.rows)
+        self.state["n_rows"] = len(self.rows)
+
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.state, ensure_ascii=False))
+        os.replace(tmp_path, self.state_path)
+
+    def set_header(self, columns):
+        scheduler = self.scheduler
+        self.state["columns"] = columns
+        self.header = scheduler.get_form_header(columns)
+        self.stamp_index = (
+            columns.index(scheduler.TIMESTAMP_COLUMN)
+            if scheduler.TIMESTAMP_COLUMN in columns
+            else None
+        )
+        work_days = {
+            date: self.header.day_by_label[date] for date in self.header.work_dates
+        }
+        all_dates = scheduler.build_calendar(work_days)
+        scheduler.load_special_dates(all_dates)
+        # Weekend form dates are never staffed, so they add no demand
+        self.requirements = {
+            (date, shift): scheduler.get_staff_requirement(date, shift)
+            for date in self.header.work_dates
+            if not scheduler.is_weekend(date)
+            for shift in scheduler.get_available_shifts(date)
+        }
+
+    def parse_stamp(self, values):
+        if self.stamp_index is None:
+            return None
+        try:
+            stamp = datetime.strptime(
+                values[self.stamp_index], self.scheduler.TIMESTAMP_FORMAT
+            )
+        except ValueError:
+            return None
+        return stamp.isoformat()
+
+    def read_new_rows(self):
+        # The rows added since the last run, plus the offset to resume from.
+        # Starts over when the file has to be read from scratch
+        state = self.state
+        offset = state["offset"]
+        with open(self.scheduler.FILEPATH, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            appended = (
+                state["columns"] is not None
+                and size >= offset
+                and probe_hash(f, 0, min(PROBE, offset)) == state["head_hash"]
+                and probe_hash(f, max(0, offset - PROBE), offset) == state["tail_hash"]
+            )
+            start = offset if appended else 0
+            f.seek(start)
+            data = f.read()
+
+        # A row still being written has no line break yet; it is picked up on
+        # the next run
+        end = data.rfind(b"\n") + 1
+        rows = list(csv.reader(io.StringIO(data[:end].decode("utf-8"))))
+        if appended:
+            width = len(state["columns"])
+            return [row for row in rows if len(row) == width], start + end
+        if not rows:
+            return [], 0
+
+        columns = rows[0]
+        rows = [row for row in rows[1:] if len(row) == len(columns)]
+        if columns == state["columns"] and state["last_stamp"] is not None:
+            # Re-downloaded rather than appended: the rows newer than the last
+            # Tidsmerke are new, as long as every older row is still there
+            stamps = [self.parse_stamp(row) for row in rows]
+            if all(stamps):
+                old = sum(stamp <= state["last_stamp"] for stamp in stamps)
+                if old == len(self.rows):
+                    return [
+                        row
+                        for row, stamp in zip(rows, stamps)
+                        if stamp > state["last_stamp"]
+                    ], end
+
+        self.state = self.fresh_state()
+        self.reset()
+        self.scheduler.manual_review = []
+        self.set_header(columns)
+        return rows, end
+
+    def parse_row(self, row_id, values):
+        scheduler = self.scheduler
+        columns = self.state["columns"]
+        row = {
+            "id": row_id,
+            "stamp": self.parse_stamp(values),
+            "name": normalize_name(values[self.header.name_index]),
+            "email": "",
+            "member": None,
+            "availability": [],
+            "comment": "",
+        }
+        if scheduler.EMAIL_COLUMN in columns:
+            row["email"] = values[columns.index(scheduler.EMAIL_COLUMN)].strip().lower()
+
+        input_name = values[self.header.name_index]
+        if input_name:
+            matched = scheduler.find_member_match(input_name, self.all_members)
+            if matched in self.member_set:
+                row["member"] = matched
+        if row["member"] is None:
+            return row
+
+        for date, col_idx in zip(self.header.work_dates, self.header.date_indexes):
+            shifts = scheduler.parse_shifts(values[col_idx], date)
+            if shifts:
+                row["availability"].append((date, shifts))
+        if scheduler.COMMENT_COLUMN in columns:
+            comment = values[columns.index(scheduler.COMMENT_COLUMN)]
+            if comment.strip():
+                row["comment"] = comment
+        return row
+
+    def ingest_rows(self, values):
+        review_start = len(self.scheduler.manual_review)
+        rows = [
+            self.parse_row(row_id, row_values)
+            for row_id, row_values in enumerate(values, len(self.rows))
+        ]
+        self.state["manual_review"].extend(self.scheduler.manual_review[review_start:])
+        for row in rows:
+            if row["stamp"] and (
+                self.state["last_stamp"] is None
+                or row["stamp"] > self.state["last_stamp"]
+            ):
+                self.state["last_stamp"] = row["stamp"]
+        return self.add_rows(rows)
+
+    def add_rows(self, rows):
+        names = set()
+        emails = set()
+        for row in rows:
+            row["kept"] = False
+            self.rows.append(row)
+            self.by_name.setdefault(row["name"], []).append(row["id"])
+            self.by_email.setdefault(row["email"], []).append(row["id"])
+            if row["member"] is not None:
+                self.by_member.setdefault(row["member"], []).append(row["id"])
+            names.add(row["name"])
+            emails.add(row["email"])
+
+        # Keep the last row per name, then the last of those per e-mail. Only
+        # the groups that got a new row can change
+        latest_for_name = {}
+
+        def is_name_latest(row):
+            name = row["name"]
+            if not name:
+                return True
+            if name not in latest_for_name:
+                group = (self.rows[i] for i in self.by_name[name])
+                latest_for_name[name] = max(group, key=rank)["id"]
+            return latest_for_name[name] == row["id"]
+
+        for name in names:
+            emails.update(self.rows[i]["email"] for i in self.by_name[name])
+
+        affected = set()
+        for email in emails:
+            group = [self.rows[i] for i in self.by_email[email]]
+            survivors = [row for row in group if is_name_latest(row)]
+            keep = {row["id"] for row in survivors}
+            if email and survivors:
+                keep = {max(survivors, key=rank)["id"]}
+            for row in group:
+                kept = row["id"] in keep
+                if row["kept"] != kept:
+                    row["kept"] = kept
+                    affected.add(row["member"])
+        affected.discard(None)
+        self.resolve_members(affected)
+        return affected
+
+    def resolve_members(self, members):
+        # Replays the stdlib ingest rule for just these members: kept rows in
+        # file order, an older Tidsmerke never overwrites a newer one
+        for member in members:
+            old = self.winner.pop(member, None)
+            if old is not None:
+                self.add_supply(self.rows[old]["availability"], -1)
+            winner = None
+            for row_id in self.by_member.get(member, ()):
+                row = self.rows[row_id]
+                if not row["kept"]:
+                    continue
+                if (
+                    winner is not None
+                    and winner["stamp"] is not None
+                    and row["stamp"] is not None
+                    and row["stamp"] < winner["stamp"]
+                ):
+                    continue
+                winner = row
+            if winner is not None:
+                self.winner[member] = winner["id"]
+                self.add_supply(winner["availability"], 1)
+
+    def add_supply(self, availability, sign):
+        for date, shifts in availability:
+            for shift in shifts:
+                slot = (date, shift)
+                self.supply[slot] = self.supply.get(slot, 0) + sign
+
+    def poll(self):
+        if self.state is None:
+            self.load_state()
+
+        rows, offset = self.read_new_rows()
+        affected = self.ingest_rows(rows) if rows else set()
+
+        with open(self.scheduler.FILEPATH, "rb") as f:
+            self.state["offset"] = offset
+            self.state["head_hash"] = probe_hash(f, 0, min(PROBE, offset))
+            self.state["tail_hash"] = probe_hash(f, max(0, offset - PROBE), offset)
+        self.save_state()
+        return len(rows), affected
+
+    def availability(self):
+        rows = [self.rows[row_id] for row_id in sorted(self.winner.values())]
+        staff_availability = {
+            row["member"]: [
+                (date, list(shifts)) for date, shifts in row["availability"]
+            ]
+            for row in rows
+        }
+        comments = {row["member"]: row["comment"] for row in rows if row["comment"]}
+        return staff_availability, set(staff_availability), comments
+
+    def coverage(self):
+        short = {}
+        covered = 0
+        for slot, required in self.requirements.items():
+            supply = self.supply.get(slot, 0)
+            covered += min(supply, required)
+            if supply < required:
+                short[slot] = (supply, required)
+        return {
+            "members": len(self.all_members),
+            "responded": len(self.winner),
+            "required": sum(self.requirements.values()),
+            "covered": covered,
+            "short": short,
+        }
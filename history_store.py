@@ -0,0 +1,79 @@
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    member TEXT NOT NULL,
+    shift_date TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    venue TEXT NOT NULL DEFAULT '',
+    UNIQUE (venue, shift_date, shift, member)
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_date_member
+    ON assignments (shift_date, member);
+CREATE INDEX IF NOT EXISTS idx_assignments_member_date
+    ON assignments (member, shift_date);
+"""
+
+
+class HistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_month(self, assignments, month_start, month_end, venue=""):
+        # Re-running a month replaces its rows, so history never double counts
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM assignments "
+                "WHERE venue = ? AND shift_date >= ? AND shift_date < ?",
+                (venue, month_start, month_end),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO assignments (member, shift_date, shift, venue) "
+                "VALUES (?, ?, ?, ?)",
+                [(member, day, shift, venue) for member, day, shift in assignments],
+            )
+
+    def cumulative_counts(self, before=None, venue=None):
+        query = "SELECT member, COUNT(*) FROM assignments"
+        clauses = []
+        params = []
+        if before is not None:
+            clauses.append("shift_date < ?")
+            params.append(before)
+        if venue is not None:
+            clauses.append("venue = ?")
+            params.append(venue)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " GROUP BY member"
+        return dict(self.conn.execute(query, params).fetchall())
+
+    def assignments_between(self, start, end, venue=None):
+        query = (
+            "SELECT member, shift_date, shift FROM assignments "
+            "WHERE shift_date >= ? AND shift_date < ?"
+        )
+        params = [start, end]
+        if venue is not None:
+            query += " AND venue = ?"
+            params.append(venue)
+        return self.conn.execute(query + " ORDER BY shift_date", params).fetchall()
+
+    def member_history(self, member):
+        return self.conn.execute(
+            "SELECT shift_date, shift, venue FROM assignments "
+            "WHERE member = ? ORDER BY shift_date",
+            (member,),
+        ).fetchall()
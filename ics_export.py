@@ -0,0 +1,157 @@
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+TIMEZONE = "Europe/Oslo"
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TIMEZONE}",
+    "BEGIN:STANDARD",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "END:STANDARD",
+    "BEGIN:DAYLIGHT",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "END:DAYLIGHT",
+    "END:VTIMEZONE",
+]
+
+
+def invert_schedule(schedule):
+    member_shifts = {}
+    for date, shifts in schedule.items():
+        for shift, staff_list in shifts.items():
+            if staff_list is None:
+                continue
+            for member in staff_list:
+                member_shifts.setdefault(member, []).append((date, shift))
+    return member_shifts
+
+
+def shift_window(day, time_range):
+    start_text, end_text = time_range.split("-")
+    start = datetime.combine(day, datetime.strptime(start_text, "%H:%M").time())
+    end = datetime.combine(day, datetime.strptime(end_text, "%H:%M").time())
+    # Closing runs past midnight, so it ends on the next calendar day
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def escape_text(value):
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line):
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte UTF-8 character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts)
+
+
+def member_slug(member):
+    return re.sub(r"[^\w]+", "_", member.strip().lower()).strip("_") or "member"
+
+
+class IcsExporter:
+    def __init__(self, shift_config, date_resolver, calendar_name="Bar shifts"):
+        self.shift_config = shift_config
+        self.date_resolver = date_resolver
+        self.calendar_name = calendar_name
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.windows = {}
+
+    def get_window(self, date, shift):
+        key = (date, shift)
+        if key not in self.windows:
+            self.windows[key] = shift_window(
+                self.date_resolver(date), self.shift_config[shift]["time"]
+            )
+        return self.windows[key]
+
+    def event_lines(self, member, date, shift, with_name):
+        start, end = self.get_window(date, shift)
+        summary = f"{shift.capitalize()} shift"
+        if with_name:
+            summary = f"{member}: {summary}"
+        return [
+            "BEGIN:VEVENT",
+            f"UID:{start:%Y%m%d}-{shift}-{member_slug(member)}@bar-scheduler",
+            f"DTSTAMP:{self.stamp}",
+            f"DTSTART;TZID={TIMEZONE}:{start:%Y%m%dT%H%M%S}",
+            f"DTEND;TZID={TIMEZONE}:{end:%Y%m%dT%H%M%S}",
+            fold_line(f"SUMMARY:{escape_text(summary)}"),
+            "END:VEVENT",
+        ]
+
+    def calendar_lines(self, events):
+        return [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//bar-scheduler//EN",
+            "CALSCALE:GREGORIAN",
+            fold_line(f"X-WR-CALNAME:{escape_text(self.calendar_name)}"),
+            *VTIMEZONE,
+            *events,
+            "END:VCALENDAR",
+        ]
+
+    def write(self, path, lines):
+        with open(path, "w", encoding="utf-8", newline="", buffering=1 << 16) as f:
+            f.write("\r\n".join(lines))
+            f.write("\r\n")
+
+    def export(self, schedule, out_dir, combined=False):
+        os.makedirs(out_dir, exist_ok=True)
+        member_shifts = invert_schedule(schedule)
+
+        if combined:
+            events = [
+                line
+                for member, shifts in member_shifts.items()
+                for date, shift in shifts
+                for line in self.event_lines(member, date, shift, with_name=True)
+            ]
+            path = os.path.join(out_dir, "schedule.ics")
+            self.write(path, self.calendar_lines(events))
+            return [path]
+
+        paths = []
+        used_slugs = {}
+        for member, shifts in member_shifts.items():
+            slug = member_slug(member)
+            used_slugs[slug] = used_slugs.get(slug, 0) + 1
+            if used_slugs[slug] > 1:
+                slug = f"{slug}_{used_slugs[slug]}"
+
+            events = [
+                line
+                for date, shift in shifts
+                for line in self.event_lines(member, date, shift, with_name=False)
+            ]
+            path = os.path.join(out_dir, f"{slug}.ics")
+            self.write(path, self.calendar_lines(events))
+            paths.append(path)
+        return paths
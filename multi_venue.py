@@ -0,0 +1,342 @@
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from name_index import MemberIndex, normalize_name
+from rng_streams import RngStreams
+
+
+def find_components(venue_members):
+    parent = {venue: venue for venue in venue_members}
+
+    def find(venue):
+        while parent[venue] != venue:
+            parent[venue] = parent[parent[venue]]
+            venue = parent[venue]
+        return venue
+
+    first_venue = {}
+    for venue, members in venue_members.items():
+        for member in members:
+            other = first_venue.setdefault(member, venue)
+            parent[find(venue)] = find(other)
+
+    components = {}
+    for venue in venue_members:
+        components.setdefault(find(venue), []).append(venue)
+    return list(components.values())
+
+
+def solve_component(problems, history, seed=None, worker=0):
+    streams = RngStreams(seed, worker)
+    shift_rng = streams.stage("shifts")
+    schedules = {venue: problem["schedule"] for venue, problem in problems.items()}
+    worked = {}
+    loads = {}
+
+    def is_free(member, day):
+        days = worked.get(member, ())
+        return day - 1 not in days and day not in days and day + 1 not in days
+
+    def place(member, venue, date, shifts):
+        requirements = problems[venue]["requirements"]
+        for shift in shifts:
+            staff_list = schedules[venue][date][shift]
+            if staff_list is not None and len(staff_list) < requirements[(date, shift)]:
+                staff_list.append(member)
+                worked.setdefault(member, set()).add(problems[venue]["days"][date])
+                loads[member] = loads.get(member, 0) + 1
+                return True
+        return False
+
+    def open_shifts(member, venue, date, declared=()):
+        shifts = [
+            shift
+            for shift, staff_list in schedules[venue][date].items()
+            if staff_list is not None
+        ]
+        shift_rng.shuffle(shifts)
+        shifts.sort(key=lambda shift: shift not in declared)
+        preferences = problems[venue]["preferences"]
+        if preferences is not None:
+            local = problems[venue]["local"].get(member, member)
+            preferences.rank_shifts(local, date, shifts)
+        return shifts
+
+    def date_weight(member, venue, date):
+        # Each venue ranks with its own preference model and member names
+        preferences = problems[venue]["preferences"]
+        if preferences is None:
+            return 0.0
+        local = problems[venue]["local"].get(member, member)
+        return preferences.date_weights.get(local, {}).get(date, 0.0)
+
+    def by_history(members, rng):
+        members = list(members)
+        rng.shuffle(members)
+        return sorted(members, key=lambda member: history.get(member, 0))
+
+    options = {}
+    for venue, problem in problems.items():
+        for member, availability in problem["availability"].items():
+            for date, declared in availability:
+                if date in problem["days"]:
+                    options.setdefault(member, []).append((venue, date, declared))
+
+    # Listed somewhere in this component but answered none of its forms
+    no_reply = {}
+    for venue, problem in problems.items():
+        for member in problem["members"]:
+            if member not in options:
+                no_reply.setdefault(member, []).extend(
+                    (venue, date, ()) for date in problem["days"]
+                )
+
+    for shifts_needed in (1, 2):
+        for pool, stage in ((options, "respondents"), (no_reply, "no_reply")):
+            rng = streams.stage(stage)
+            for member in by_history(pool, rng):
+                if loads.get(member, 0) >= shifts_needed:
+                    continue
+                candidates = pool[member]
+                rng.shuffle(candidates)
+                candidates.sort(key=lambda c: -date_weight(member, c[0], c[1]))
+                for venue, date, declared in candidates:
+                    day = problems[venue]["days"][date]
+                    if not is_free(member, day):
+                        continue
+                    shifts = open_shifts(member, venue, date, declared)
+                    if place(member, venue, date, shifts):
+                        if loads[member] >= shifts_needed:
+                            break
+    return schedules
+
+
+def find_conflicts(schedules, days):
+    bookings = {}
+    for venue, schedule in schedules.items():
+        for date, shifts in schedule.items():
+            for shift, staff_list in shifts.items():
+                for member in staff_list or ():
+                    bookings.setdefault(member, []).append(
+                        (days[venue][date], venue, date, shift)
+                    )
+
+    conflicts = []
+    for member, booked in bookings.items():
+        booked.sort()
+        for earlier, later in zip(booked, booked[1:]):
+            if earlier[1] == later[1] or later[0] - earlier[0] > 1:
+                continue
+            conflicts.append(
+                {
+                    "member": member,
+                    "kind": (
+                        "double_booked"
+                        if earlier[0] == later[0]
+                        else "consecutive_days"
+                    ),
+                    "bookings": [
+                        {"venue": venue, "date": date, "shift": shift}
+                        for _, venue, date, shift in (earlier, later)
+                    ],
+                }
+            )
+    return conflicts
+
+
+def venue_slug(venue):
+    return normalize_name(venue) or "venue"
+
+
+class MultiVenueScheduler:
+    def __init__(self, schedulers, seed=None, workers=None):
+        self.schedulers = schedulers
+        # One root seed for the whole run; component i solves on worker i
+        self.seed = RngStreams(seed).seed
+        self.workers = workers or os.cpu_count() or 1
+        self.canonical = {}
+        self.conflicts = []
+        self.components = []
+
+    def merge_identities(self, venue_members):
+        # Only exact, normalized or typo-level matches merge two people; a
+        # shared first name is not enough to treat them as the same member
+        pool = []
+        for venue, members in venue_members.items():
+            threshold = self.schedulers[venue].MIN_CONFIDENCE_THRESHOLD
+            index = MemberIndex(list(pool))
+            mapping = {}
+            for member in members:
+                canonical = index.by_lower.get(member.lower())
+                if canonical is None:
+                    same = index.by_normalized.get(normalize_name(member), [])
+                    if len(same) == 1:
+                        canonical = index.members[same[0]]
+                if canonical is not None:
+                    mapping[member] = canonical
+
+            # Typo matches only get the names no exact match has claimed
+            claimed = set(mapping.values())
+            for member in members:
+                if member in mapping:
+                    continue
+                parts = set(normalize_name(p) for p in member.split())
+                best = sorted(
+                    index.fuzzy_scores(parts).items(), key=lambda item: -item[1]
+                )[:2]
+                canonical = None
+                if (
+                    best
+                    and best[0][1] >= threshold
+                    and (len(best) == 1 or best[1][1] < best[0][1])
+                ):
+                    canonical = index.members[best[0][0]]
+                if canonical is None or canonical in claimed:
+                    canonical = member
+                    if canonical in index.by_lower.values():
+                        canonical = f"{member} ({venue})"
+                    pool.append(canonical)
+                claimed.add(canonical)
+                mapping[member] = canonical
+            self.canonical[venue] = mapping
+        return pool
+
+    def build_problem(self, venue, all_members):
+        scheduler = self.schedulers[venue]
+        to_canonical = self.canonical[venue]
+        work_dates, all_dates, schedule, staff_availability = (
+            scheduler.prepare_schedule(all_members)
+        )
+        # Form dates only, like the single-venue solver: filler days were never
+        # offered, and no-reply members would otherwise be put on them
+        workdays = [date for date in work_dates if not scheduler.is_weekend(date)]
+        scheduler.preferences = scheduler.build_preferences(
+            work_dates, staff_availability
+        )
+        problem = {
+            "schedule": schedule,
+            "requirements": {
+                (date, shift): scheduler.get_staff_requirement(date, shift)
+                for date in workdays
+                for shift, staff_list in schedule[date].items()
+                if staff_list is not None
+            },
+            "days": {date: scheduler.get_day(date) for date in workdays},
+            "availability": {
+                to_canonical[member]: availability
+                for member, availability in staff_availability.items()
+            },
+            "members": [to_canonical[member] for member in all_members],
+            "preferences": scheduler.preferences,
+            "local": {canonical: member for member, canonical in to_canonical.items()},
+        }
+        return problem, (work_dates, all_dates, staff_availability)
+
+    def solve(self, problems):
+        history = {}
+        for venue in problems:
+            to_canonical = self.canonical[venue]
+            for member, count in self.schedulers[venue].history_counts.items():
+                member = to_canonical.get(member, member)
+                history[member] = max(history.get(member, 0), count)
+
+        self.components = find_components(
+            {venue: problem["members"] for venue, problem in problems.items()}
+        )
+        for idx, component in enumerate(self.components):
+            for venue in component:
+                self.schedulers[venue].rng_streams = RngStreams(self.seed, idx)
+        jobs = [
+            (
+                {venue: problems[venue] for venue in component},
+                history,
+                self.seed,
+                idx,
+            )
+            for idx, component in enumerate(self.components)
+        ]
+
+        # Venues that share no staff cannot conflict, so each group of
+        # connected venues is an independent problem
+        if len(jobs) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                results = list(pool.map(solve_component, *zip(*jobs)))
+        else:
+            results = [solve_component(*job) for job in jobs]
+
+        schedules = {}
+        for result in results:
+            schedules.update(result)
+        return schedules
+
+    def create_schedules(self):
+        venue_members = {}
+        for venue, scheduler in self.schedulers.items():
+            venue_members[venue] = scheduler.load_members()
+            scheduler.load_history()
+        self.merge_identities(venue_members)
+
+        problems = {}
+        inputs = {}
+        for venue, all_members in venue_members.items():
+            problems[venue], inputs[venue] = self.build_problem(venue, all_members)
+        schedules = self.solve(problems)
+
+        self.conflicts = find_conflicts(
+            schedules, {venue: problem["days"] for venue, problem in problems.items()}
+        )
+        if self.conflicts:
+            print(f"Warning: {len(self.conflicts)} cross-venue conflicts")
+
+        snapshots = {}
+        for venue, schedule in schedules.items():
+            scheduler = self.schedulers[venue]
+            to_local = {
+                canonical: member for member, canonical in self.canonical[venue].items()
+            }
+            schedule = {
+                date: {
+                    shift: (
+                        None
+                        if staff_list is None
+                        else [to_local.get(member, member) for member in staff_list]
+                    )
+                    for shift, staff_list in shifts.items()
+                }
+                for date, shifts in schedule.items()
+            }
+            work_dates, all_dates, staff_availability = inputs[venue]
+            all_members = venue_members[venue]
+            schedule = scheduler.validate_schedule(schedule, all_dates)
+            scheduler.violations = scheduler.find_violations(
+                schedule, staff_availability
+            )
+            scheduler.record_history(schedule)
+
+            wb = scheduler.build_workbook(
+                schedule, all_dates, work_dates, all_members, staff_availability
+            )
+            save_path = (
+                f"{scheduler.USERPATH}{venue_slug(venue)}_"
+                f"{scheduler.MONTH_NAME.lower()}_schedule_{scheduler.YEAR}.xlsx"
+            )
+            buffer = io.BytesIO()
+            wb.save(buffer)
+            print(f"Saving {venue} schedule to: {save_path}")
+            with open(save_path, "wb") as f:
+                f.write(buffer.getvalue())
+
+            snapshot = scheduler.make_snapshot(
+                schedule, all_dates, work_dates, all_members, staff_availability
+            )
+            with open(save_path[:-5] + ".json", "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            snapshots[venue] = snapshot
+
+        return {
+            "venues": snapshots,
+            "components": self.components,
+            "conflicts": self.conflicts,
+        }
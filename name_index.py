@@ -0,0 +1,131 @@
+def normalize_name(name):
+    return "".join(c.lower() for c in name if c.isalnum())
+
+
+def edit_distance(a, b):
+    # Damerau-Levenshtein (optimal string alignment): one adjacent
+    # transposition counts as a single edit
+    if a == b:
+        return 0
+    if not a or not b:
+        return len(a) or len(b)
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost,
+            )
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+MAX_TYPOS = 2
+
+
+def max_typos(token):
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 5:
+        return 1
+    return MAX_TYPOS
+
+
+def deletion_variants(token, max_deletes):
+    variants = {token}
+    frontier = {token}
+    for _ in range(max_deletes):
+        frontier = {
+            word[:i] + word[i + 1 :] for word in frontier for i in range(len(word))
+        }
+        variants |= frontier
+    return variants
+
+
+class TypoIndex:
+    # Deletion neighbourhood index: two tokens within k edits always share a
+    # variant reachable by at most k deletions from each, so a lookup only
+    # touches the buckets of its own variants instead of the whole roster
+    def __init__(self, tokens=()):
+        self.buckets = {}
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token):
+        for variant in deletion_variants(token, MAX_TYPOS):
+            self.buckets.setdefault(variant, set()).add(token)
+
+    def search(self, token, max_distance):
+        candidates = set()
+        for variant in deletion_variants(token, max_distance):
+            candidates.update(self.buckets.get(variant, ()))
+
+        found = []
+        for candidate in candidates:
+            if abs(len(candidate) - len(token)) > max_distance:
+                continue
+            distance = edit_distance(token, candidate)
+            if distance <= max_distance:
+                found.append((candidate, distance))
+        return found
+
+
+class MemberIndex:
+    def __init__(self, members):
+        self.source = members
+        self.members = list(members)
+        self.by_lower = {}
+        self.by_normalized = {}
+        self.by_first = {}
+        self.by_token = {}
+        self.normalized = []
+        self.parts = []
+
+        for idx, member in enumerate(self.members):
+            self.by_lower.setdefault(member.lower(), member)
+            normalized = normalize_name(member)
+            parts = set(normalize_name(p) for p in member.split())
+            self.normalized.append(normalized)
+            self.parts.append(parts)
+            self.by_normalized.setdefault(normalized, []).append(idx)
+            if member.split():
+                first = normalize_name(member.split()[0])
+                self.by_first.setdefault(first, []).append(idx)
+            for part in parts:
+                self.by_token.setdefault(part, []).append(idx)
+
+        self.typo_index = TypoIndex(token for token in self.by_token if token)
+
+    def fuzzy_scores(self, input_parts):
+        best = {}
+        for part in input_parts:
+            if not part:
+                continue
+            for token, distance in self.typo_index.search(part, max_typos(part)):
+                similarity = 1 - distance / max(len(part), len(token))
+                for idx in self.by_token[token]:
+                    member_best = best.setdefault(idx, {})
+                    if similarity > member_best.get(part, 0):
+                        member_best[part] = similarity
+
+        return {
+            idx: sum(similarities.values())
+            / max(len(input_parts), len(self.parts[idx]))
+            for idx, similarities in best.items()
+        }
+
+    def candidates(self, input_name, input_parts, fuzzy_scores):
+        found = set(self.by_normalized.get(normalize_name(input_name), []))
+        if input_name.split():
+            found.update(self.by_first.get(normalize_name(input_name.split()[0]), []))
+        for part in input_parts:
+            found.update(self.by_token.get(part, []))
+        found.update(fuzzy_scores)
+        return sorted(found)
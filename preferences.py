@@ -0,0 +1,142 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from form_header import WEEKDAY_NAMES
+
+WEEKDAY_PATTERN = re.compile(
+    r"\b(" + "|".join(WEEKDAY_NAMES) + r")(?:er|en|ene)?\b", re.I
+)
+SHIFT_PATTERNS = {
+    "opening": re.compile(
+        r"\b(?:åpning\w*|åpne\w*|tidlig\w*|formiddag\w*|dagvakt\w*|12[:.]30)", re.I
+    ),
+    "middle": re.compile(r"\b(?:mellom\w*|midt\w*|ettermiddag\w*|16[:.]50)", re.I),
+    "closing": re.compile(
+        r"\b(?:steng\w*|kveld\w*|sen(?:t|e|vakt\w*)?\b|natt\w*|20[:.]20)", re.I
+    ),
+}
+NEGATIVE_PATTERN = re.compile(
+    r"\b(?:ikke|unngå\w*|dårlig\w*|vanskelig\w*|nei|aldri)\b", re.I
+)
+POSITIVE_PATTERN = re.compile(
+    r"\b(?:bra|gjerne|helst|foretrekk\w*|liker|fint|best|ønsk\w*|passer|perfekt"
+    r"|flott)\b",
+    re.I,
+)
+CLAUSE_PATTERN = re.compile(r"[.,;:!?\n]+|\bmen\b", re.I)
+
+# A clause that names a day or shift without saying how the member feels about
+# it is read as a mild wish to work it
+NEUTRAL_WEIGHT = 0.5
+
+
+@lru_cache(maxsize=None)
+def parse_comment(text):
+    if not isinstance(text, str):
+        return ()
+
+    preferences = []
+    for clause in CLAUSE_PATTERN.split(text):
+        weekdays = [
+            WEEKDAY_NAMES.index(match.lower())
+            for match in WEEKDAY_PATTERN.findall(clause)
+        ]
+        shifts = [
+            shift for shift, pattern in SHIFT_PATTERNS.items() if pattern.search(clause)
+        ]
+        if not weekdays and not shifts:
+            continue
+
+        if NEGATIVE_PATTERN.search(clause):
+            weight = -1.0
+        elif POSITIVE_PATTERN.search(clause):
+            weight = 1.0
+        else:
+            weight = NEUTRAL_WEIGHT
+        for weekday in weekdays or [None]:
+            for shift in shifts or [None]:
+                preferences.append((weekday, shift, weight))
+    return tuple(preferences)
+
+
+class PreferenceModel:
+    def __init__(self, members, dates, shifts, weights):
+        self.members = members
+        self.dates = dates
+        self.shifts = shifts
+        self.weights = weights
+
+        # Lookups the solver hits on every placement attempt; members without
+        # any preference are left out so they skip sorting entirely
+        self.slot_weights = {}
+        self.date_weights = {}
+        member_idx, date_idx = np.nonzero(np.any(weights != 0, axis=2))
+        for m, d in zip(member_idx.tolist(), date_idx.tolist()):
+            row = weights[m, d].tolist()
+            member, date = members[m], dates[d]
+            self.slot_weights[(member, date)] = dict(zip(shifts, row))
+            self.date_weights.setdefault(member, {})[date] = max(row)
+
+    def rank_dates(self, member, availability):
+        by_date = self.date_weights.get(member)
+        if by_date:
+            availability.sort(key=lambda item: -by_date.get(item[0], 0.0))
+
+    def rank_shifts(self, member, date, shifts):
+        by_shift = self.slot_weights.get((member, date))
+        if by_shift:
+            shifts.sort(key=lambda shift: -by_shift.get(shift, 0.0))
+
+    def score(self, schedule):
+        total = 0.0
+        for date, shifts in schedule.items():
+            for shift, staff_list in shifts.items():
+                for member in staff_list or ():
+                    by_shift = self.slot_weights.get((member, date))
+                    if by_shift:
+                        total += by_shift.get(shift, 0.0)
+        return total
+
+
+def build_preferences(
+    staff_availability,
+    comments,
+    dates,
+    weekdays,
+    shifts,
+    comment_weight=1.0,
+    form_weight=2.0,
+):
+    members = sorted(set(staff_availability) | set(comments))
+    member_ids = {member: idx for idx, member in enumerate(members)}
+    date_ids = {date: idx for idx, date in enumerate(dates)}
+    shift_ids = {shift: idx for idx, shift in enumerate(shifts)}
+    weights = np.zeros((len(members), len(dates), len(shifts)), dtype=np.float32)
+
+    date_weekday = np.array([weekdays[date] for date in dates])
+    for member, text in comments.items():
+        row = weights[member_ids[member]]
+        for weekday, shift, weight in parse_comment(text):
+            day_mask = (
+                slice(None)
+                if weekday is None
+                else np.flatnonzero(date_weekday == weekday)
+            )
+            if shift is None:
+                row[day_mask, :] += comment_weight * weight
+            else:
+                row[day_mask, shift_ids[shift]] += comment_weight * weight
+
+    # The shift a member ticked on the form is an explicit wish for that date
+    for member, availability in staff_availability.items():
+        row = weights[member_ids[member]]
+        for date, offered in availability:
+            if date not in date_ids:
+                continue
+            for shift in offered:
+                if shift in shift_ids:
+                    row[date_ids[date], shift_ids[shift]] += form_weight
+
+    return PreferenceModel(members, list(dates), list(shifts), weights)
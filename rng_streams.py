@@ -0,0 +1,40 @@
+import hashlib
+import random
+import secrets
+
+STAGES = ("respondents", "shifts", "no_reply", "simulation")
+
+
+class RngStreams:
+    def __init__(self, seed=None, worker=0):
+        # Without a seed the entropy is drawn once and kept, so any run can
+        # be replayed from (seed, worker) afterwards
+        self.seed = secrets.randbits(128) if seed is None else seed
+        self.worker = worker
+        self.streams = {}
+
+    def sequence(self, stage):
+        import numpy as np
+
+        return np.random.SeedSequence(
+            self.seed, spawn_key=(self.worker, STAGES.index(stage))
+        )
+
+    def stage(self, stage):
+        # The solver stages only need the standard library, so their seeds
+        # are hashed rather than drawn from a numpy SeedSequence
+        stream = self.streams.get(stage)
+        if stream is None:
+            key = f"{self.seed}:{self.worker}:{STAGES.index(stage)}"
+            digest = hashlib.sha256(key.encode("ascii")).digest()
+            stream = random.Random(int.from_bytes(digest, "little"))
+            self.streams[stage] = stream
+        return stream
+
+    def generator(self, stage):
+        import numpy as np
+
+        return np.random.default_rng(self.sequence(stage))
+
+    def spawn(self, worker):
+        return RngStreams(self.seed, worker)
@@ -0,0 +1,158 @@
+from itertools import combinations
+
+import numpy as np
+
+
+def build_slots(schedule, work_dates):
+    # Only dates on the form; nobody could offer to cover the filler days
+    # build_calendar adds between them
+    slots = []
+    for date in work_dates:
+        for shift, staff_list in schedule.get(date, {}).items():
+            if staff_list is not None:
+                slots.append((date, shift))
+    return slots
+
+
+def find_standbys(schedule, work_dates, staff_availability, slots):
+    working = {}
+    for date, shifts in schedule.items():
+        working[date] = {
+            member
+            for staff_list in shifts.values()
+            if staff_list is not None
+            for member in staff_list
+        }
+
+    neighbours = {}
+    for idx, date in enumerate(work_dates):
+        neighbours[date] = [
+            work_dates[j] for j in (idx - 1, idx + 1) if 0 <= j < len(work_dates)
+        ]
+
+    slot_index = {slot: idx for idx, slot in enumerate(slots)}
+    eligible = {}
+    for member, availability in staff_availability.items():
+        for date, shifts in availability:
+            if date not in working or member in working[date]:
+                continue
+            # Covering must not create back-to-back working days
+            if any(member in working.get(other, ()) for other in neighbours[date]):
+                continue
+            for shift in shifts:
+                idx = slot_index.get((date, shift))
+                if idx is not None:
+                    eligible.setdefault(member, []).append(idx)
+    return eligible
+
+
+def simulate_no_shows(
+    schedule,
+    work_dates,
+    staff_availability,
+    get_requirement=None,
+    scenarios=10000,
+    no_show_rate=0.1,
+    seed=None,
+    batch_size=2000,
+):
+    rng = np.random.default_rng(seed)
+    slots = build_slots(schedule, work_dates)
+    n_slots = len(slots)
+
+    assigned_slot = np.array(
+        [idx for idx, (date, shift) in enumerate(slots) for _ in schedule[date][shift]],
+        dtype=np.intp,
+    )
+    slot_onehot = np.zeros((len(assigned_slot), n_slots), dtype=np.int32)
+    slot_onehot[np.arange(len(assigned_slot)), assigned_slot] = 1
+
+    # Slots that were already short before anyone called in sick
+    shortfall = np.zeros(n_slots, dtype=np.int32)
+    if get_requirement is not None:
+        for idx, (date, shift) in enumerate(slots):
+            missing = get_requirement(date, shift) - len(schedule[date][shift])
+            shortfall[idx] = max(0, missing)
+
+    eligible = find_standbys(schedule, work_dates, staff_availability, slots)
+    standbys = list(eligible)
+    eligibility = np.zeros((len(standbys), n_slots), dtype=np.int32)
+    for row, member in enumerate(standbys):
+        eligibility[row, eligible[member]] = 1
+
+    # Hall's condition per date: every group of short-staffed slots on a date
+    # needs at least as many present standbys as people missing
+    slots_by_date = {}
+    for idx, (date, _) in enumerate(slots):
+        slots_by_date.setdefault(date, []).append(idx)
+    date_groups = {
+        date: [
+            list(group)
+            for size in range(1, len(indexes) + 1)
+            for group in combinations(indexes, size)
+        ]
+        for date, indexes in slots_by_date.items()
+    }
+    group_masks = {
+        date: [
+            (group, (eligibility[:, group].sum(axis=1) > 0).astype(np.int32))
+            for group in groups
+        ]
+        for date, groups in date_groups.items()
+    }
+
+    slot_failures = np.zeros(n_slots, dtype=np.int64)
+    missing_total = np.zeros(n_slots, dtype=np.int64)
+    date_failures = {date: 0 for date in slots_by_date}
+    standby_calls = np.zeros(len(standbys), dtype=np.int64)
+
+    done = 0
+    while done < scenarios:
+        batch = min(batch_size, scenarios - done)
+        absent = rng.random((batch, len(assigned_slot))) < no_show_rate
+        present = rng.random((batch, len(standbys))) >= no_show_rate
+        present = present.astype(np.int32)
+
+        deficit = absent.astype(np.int32) @ slot_onehot + shortfall
+        cover = present @ eligibility
+
+        slot_failures += (deficit > cover).sum(axis=0)
+        missing_total += deficit.sum(axis=0)
+
+        for date, groups in group_masks.items():
+            failed = np.zeros(batch, dtype=bool)
+            for group, mask in groups:
+                failed |= deficit[:, group].sum(axis=1) > present @ mask
+            date_failures[date] += int(failed.sum())
+
+        short = (deficit > 0).astype(np.int32)
+        standby_calls += ((short @ eligibility.T) > 0).sum(axis=0)
+        done += batch
+
+    return {
+        "scenarios": scenarios,
+        "no_show_rate": no_show_rate,
+        "slots": [
+            {
+                "date": date,
+                "shift": shift,
+                "assigned": len(schedule[date][shift]),
+                "standbys": int(eligibility[:, idx].sum()),
+                "failure_probability": float(slot_failures[idx] / scenarios),
+                "expected_missing": float(missing_total[idx] / scenarios),
+            }
+            for idx, (date, shift) in enumerate(slots)
+        ],
+        "dates": [
+            {"date": date, "failure_probability": failures / scenarios}
+            for date, failures in date_failures.items()
+        ],
+        "standby": [
+            {
+                "member": standbys[row],
+                "call_probability": float(standby_calls[row] / scenarios),
+                "slots": [list(slots[idx]) for idx in eligible[standbys[row]]],
+            }
+            for row in np.argsort(-standby_calls, kind="stable")
+        ],
+    }
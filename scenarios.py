@@ -0,0 +1,134 @@
+class ScenarioPlanner:
+    def __init__(self, scheduler, stdlib=False):
+        self.scheduler = scheduler
+        self.all_members = scheduler.load_members()
+        scheduler.load_history()
+        work_dates, all_dates, schedule, staff_availability = (
+            scheduler.prepare_schedule(self.all_members, stdlib=stdlib)
+        )
+        self.work_dates = work_dates
+        self.all_dates = all_dates
+        self.staff_availability = staff_availability
+        self.base_schedule = scheduler.solve_schedule(
+            schedule, work_dates, all_dates, staff_availability, self.all_members
+        )
+
+        # Form dates only: filler days were never offered and are not staffed
+        self.workdays = [d for d in work_dates if not scheduler.is_weekend(d)]
+        self.neighbours = {
+            date: self.workdays[max(0, idx - 1) : idx + 2]
+            for idx, date in enumerate(self.workdays)
+        }
+        self.available_on = {date: [] for date in self.workdays}
+        for member, availability in staff_availability.items():
+            for date, _ in availability:
+                if date in self.available_on:
+                    self.available_on[date].append(member)
+        self.no_reply = sorted(scheduler.no_reply_members)
+
+    def resolve_requirements(self, overrides):
+        by_shift = overrides.get("shift", {})
+        by_weekday = {int(k): v for k, v in overrides.get("weekday", {}).items()}
+        by_date = overrides.get("date", {})
+
+        table = {}
+        for date in self.workdays:
+            weekday = self.scheduler.get_weekday(date)
+            for shift in self.scheduler.SHIFT_CONFIG:
+                base = (
+                    self.scheduler.get_staff_requirement(date, shift)
+                    if self.base_schedule[date][shift] is not None
+                    else 0
+                )
+                required = by_shift.get(shift, base)
+                required = by_weekday.get(weekday, {}).get(shift, required)
+                required = by_date.get(date, {}).get(shift, required)
+                table[(date, shift)] = required
+        return table
+
+    def evaluate(self, overrides):
+        requirements = self.resolve_requirements(overrides)
+        schedule = self.scheduler.copy_schedule(self.base_schedule)
+
+        loads = {}
+        working = {date: set() for date in self.workdays}
+        for date in self.workdays:
+            for staff_list in schedule[date].values():
+                for member in staff_list or ():
+                    loads[member] = loads.get(member, 0) + 1
+                    working[date].add(member)
+
+        # Only slots whose requirement moved are touched: shrink first so the
+        # people released can be reused by slots that grow
+        changed = []
+        for (date, shift), required in requirements.items():
+            staff_list = schedule[date][shift]
+            base = (
+                self.scheduler.get_staff_requirement(date, shift)
+                if staff_list is not None
+                else 0
+            )
+            if required == base:
+                continue
+            changed.append((date, shift))
+            if staff_list is None:
+                schedule[date][shift] = staff_list = []
+            while len(staff_list) > required:
+                member = staff_list.pop()
+                loads[member] -= 1
+                working[date].discard(member)
+
+        for date, shift in changed:
+            staff_list = schedule[date][shift]
+            required = requirements[(date, shift)]
+            if len(staff_list) >= required:
+                continue
+            candidates = sorted(
+                (
+                    member
+                    for member in self.available_on[date]
+                    if not any(member in working[d] for d in self.neighbours[date])
+                ),
+                key=lambda member: loads.get(member, 0),
+            )
+            candidates += [
+                member
+                for member in self.no_reply
+                if not any(member in working[d] for d in self.neighbours[date])
+            ]
+            for member in candidates:
+                if len(staff_list) >= required:
+                    break
+                if loads.get(member, 0) >= 2 or member in working[date]:
+                    continue
+                staff_list.append(member)
+                loads[member] = loads.get(member, 0) + 1
+                working[date].add(member)
+
+        required_total = sum(requirements.values())
+        filled_total = 0
+        short_slots = []
+        for (date, shift), required in requirements.items():
+            assigned = len(schedule[date][shift] or ())
+            filled_total += min(assigned, required)
+            if assigned < required:
+                short_slots.append(
+                    {
+                        "date": date,
+                        "shift": shift,
+                        "required": required,
+                        "assigned": assigned,
+                    }
+                )
+
+        return {
+            "required": required_total,
+            "filled": filled_total,
+            "coverage": filled_total / required_total if required_total else 1.0,
+            "short_slots": short_slots,
+            "changed_slots": len(changed),
+            "members_without_shift": sum(
+                1 for member in self.all_members if not loads.get(member)
+            ),
+            "schedule": schedule,
+        }
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+CACHE_VERSION = 2
+
+
+class ScheduleCache:
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(input_paths, config, seed, solver_mode):
+        digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+        for path in input_paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        digest.update(repr(seed).encode())
+        digest.update(str(solver_mode).encode())
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".xlsx"
+
+    def get(self, key):
+        snapshot_path, workbook_path = self._paths(key)
+        try:
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            with open(workbook_path, "rb") as f:
+                workbook = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Touching the entry keeps the mtime usable as LRU order
+        os.utime(snapshot_path)
+        os.utime(workbook_path)
+        return snapshot, workbook
+
+    def put(self, key, snapshot, workbook):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        snapshot_path, workbook_path = self._paths(key)
+
+        for path, mode, payload in (
+            (workbook_path, "wb", workbook),
+            (snapshot_path, "w", json.dumps(snapshot)),
+        ):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, mode) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        entries = {}
+        for filename in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(filename)
+            if ext not in (".json", ".xlsx"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, filename))
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith((".json", ".xlsx", ".tmp")):
+                os.remove(os.path.join(self.cache_dir, filename))
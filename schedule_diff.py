@@ -0,0 +1,86 @@
+import json
+
+
+def collect_assignments(schedule, member_ids, slot_ids):
+    assignments = set()
+    for date, shifts in schedule.items():
+        for shift, staff_list in shifts.items():
+            if not staff_list:
+                continue
+            slot_id = slot_ids.setdefault((date, shift), len(slot_ids))
+            for member in staff_list:
+                member_id = member_ids.setdefault(member, len(member_ids))
+                assignments.add((slot_id, member_id))
+    return assignments
+
+
+def count_by(assignments, position, size):
+    counts = [0] * size
+    for assignment in assignments:
+        counts[assignment[position]] += 1
+    return counts
+
+
+def diff_schedules(old_schedule, new_schedule):
+    member_ids = {}
+    slot_ids = {}
+    old = collect_assignments(old_schedule, member_ids, slot_ids)
+    new = collect_assignments(new_schedule, member_ids, slot_ids)
+    members = list(member_ids)
+    slots = list(slot_ids)
+
+    added = new - old
+    removed = old - new
+    by_member = {}
+    by_slot = {}
+    for kind, assignments in (("added", added), ("removed", removed)):
+        for slot_id, member_id in assignments:
+            date, shift = slots[slot_id]
+            member_changes = by_member.setdefault(
+                member_id, {"added": [], "removed": []}
+            )
+            member_changes[kind].append([date, shift])
+            slot_changes = by_slot.setdefault(slot_id, {"added": [], "removed": []})
+            slot_changes[kind].append(members[member_id])
+
+    old_slots = count_by(old, 0, len(slots))
+    new_slots = count_by(new, 0, len(slots))
+    old_load = count_by(old, 1, len(members))
+    new_load = count_by(new, 1, len(members))
+
+    return {
+        "added": len(added),
+        "removed": len(removed),
+        "members": {
+            members[member_id]: {
+                **by_member[member_id],
+                "old_shifts": old_load[member_id],
+                "new_shifts": new_load[member_id],
+            }
+            for member_id in range(len(members))
+            if member_id in by_member
+        },
+        "slots": [
+            {
+                "date": slots[slot_id][0],
+                "shift": slots[slot_id][1],
+                **by_slot[slot_id],
+                "old_count": old_slots[slot_id],
+                "new_count": new_slots[slot_id],
+            }
+            for slot_id in range(len(slots))
+            if slot_id in by_slot
+        ],
+        "coverage_delta": sum(new_slots) - sum(old_slots),
+        "workload": {
+            members[member_id]: new_load[member_id] - old_load[member_id]
+            for member_id in range(len(members))
+            if new_load[member_id] != old_load[member_id]
+        },
+    }
+
+
+def load_schedule(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["schedule"] if "schedule" in data else data
@@ -0,0 +1,134 @@
+import numpy as np
+
+SHIFT_OFFERED = "shift_not_offered"
+UNAVAILABLE = "availability"
+CAPACITY = "capacity"
+MULTIPLE_SHIFTS = "multiple_shifts"
+CONSECUTIVE_DAYS = "consecutive_days"
+MONDAY_CLOSING = "monday_closing"
+WEEKEND = "weekend_assignment"
+
+
+def find_violations(
+    schedule, staff_availability, no_reply_members, requirements, weekdays, days
+):
+    dates = list(schedule)
+    shifts = sorted({shift for slots in schedule.values() for shift in slots})
+    date_ids = {date: idx for idx, date in enumerate(dates)}
+    shift_ids = {shift: idx for idx, shift in enumerate(shifts)}
+    member_ids = {}
+
+    rows = []
+    for date, slots in schedule.items():
+        for shift, staff_list in slots.items():
+            for member in staff_list or ():
+                member_id = member_ids.setdefault(member, len(member_ids))
+                rows.append((member_id, date_ids[date], shift_ids[shift]))
+    members = list(member_ids)
+    if not rows:
+        return []
+
+    assigned = np.array(rows, dtype=np.int64)
+    member_col, date_col, shift_col = assigned.T
+    n_dates, n_shifts = len(dates), len(shifts)
+    slot_col = date_col * n_shifts + shift_col
+
+    date_weekday = np.array([weekdays.get(date, -1) for date in dates])
+    date_day = np.array([days.get(date) or -1 for date in dates])
+    required = np.zeros(n_dates * n_shifts, dtype=np.int64)
+    for (date, shift), count in requirements.items():
+        if date in date_ids and shift in shift_ids:
+            required[date_ids[date] * n_shifts + shift_ids[shift]] = count
+
+    violations = []
+
+    def report(kind, indexes, detail=None):
+        for idx in indexes:
+            violations.append(
+                {
+                    "kind": kind,
+                    "member": members[member_col[idx]],
+                    "date": dates[date_col[idx]],
+                    "shift": shifts[shift_col[idx]],
+                    "detail": detail,
+                }
+            )
+
+    # Capacity: every assignment past the required count is over the limit
+    order = np.argsort(slot_col, kind="stable")
+    sorted_slots = slot_col[order]
+    starts = np.searchsorted(sorted_slots, sorted_slots, side="left")
+    position = np.arange(len(order)) - starts
+    over = order[position >= required[sorted_slots]]
+    report(CAPACITY, over, "more staff than required")
+
+    # One shift per day
+    member_date = member_col * n_dates + date_col
+    _, first, counts = np.unique(member_date, return_index=True, return_counts=True)
+    report(MULTIPLE_SHIFTS, first[counts > 1], "more than one shift on this day")
+
+    # No consecutive calendar days
+    known_day = date_day[date_col] >= 0
+    worked = np.unique((member_col * 64 + date_day[date_col])[known_day])
+    worked_member, worked_day = worked // 64, worked % 64
+    back_to_back = (np.diff(worked_member) == 0) & (np.diff(worked_day) == 1)
+    day_to_date = {day: idx for idx, day in enumerate(date_day) if day >= 0}
+    for idx in np.flatnonzero(back_to_back) + 1:
+        violations.append(
+            {
+                "kind": CONSECUTIVE_DAYS,
+                "member": members[worked_member[idx]],
+                "date": dates[day_to_date[worked_day[idx]]],
+                "shift": None,
+                "detail": "also works the day before",
+            }
+        )
+
+    weekday_col = date_weekday[date_col]
+    closing = shift_ids.get("closing", -1)
+    # Monday closing only counts while no special date has opened it
+    closed = required[slot_col] == 0
+    report(
+        MONDAY_CLOSING,
+        np.flatnonzero((weekday_col == 0) & (shift_col == closing) & closed),
+    )
+    report(WEEKEND, np.flatnonzero(weekday_col >= 5))
+
+    # Availability, only for members who answered the form
+    offered_days = set()
+    offered_shifts = set()
+    for member, availability in staff_availability.items():
+        member_id = member_ids.get(member)
+        if member_id is None:
+            continue
+        for date, offered in availability:
+            if date not in date_ids:
+                continue
+            offered_days.add(member_id * n_dates + date_ids[date])
+            for shift in offered:
+                if shift in shift_ids:
+                    offered_shifts.add(
+                        (member_id * n_dates + date_ids[date]) * n_shifts
+                        + shift_ids[shift]
+                    )
+    no_reply = np.array([members[m] in no_reply_members for m in range(len(members))])
+    answered = ~no_reply[member_col]
+    day_ok = np.isin(member_date, np.fromiter(offered_days, dtype=np.int64))
+    shift_ok = np.isin(
+        member_date * n_shifts + shift_col,
+        np.fromiter(offered_shifts, dtype=np.int64),
+    )
+    report(UNAVAILABLE, np.flatnonzero(answered & ~day_ok), "not available this day")
+    report(
+        SHIFT_OFFERED,
+        np.flatnonzero(answered & day_ok & ~shift_ok),
+        "available this day, but not for this shift",
+    )
+    return violations
+
+
+def summarize(violations):
+    counts = {}
+    for violation in violations:
+        counts[violation["kind"]] = counts.get(violation["kind"], 0) + 1
+    return counts
@@ -0,0 +1,137 @@
+import csv
+from datetime import date, datetime, timedelta
+
+CLOSED = "closed"
+HOLIDAY = "holiday"
+EXAM = "exam"
+EVENT = "event"
+KINDS = (CLOSED, HOLIDAY, EXAM, EVENT)
+
+
+def easter_sunday(year):
+    # Anonymous Gregorian algorithm (Meeus/Jones/Butcher)
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    weekday = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * weekday) // 451
+    month, day = divmod(h + weekday - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def norwegian_holidays(year):
+    easter = easter_sunday(year)
+    holidays = {
+        date(year, 1, 1): "Nyttårsdag",
+        date(year, 5, 1): "Arbeidernes dag",
+        date(year, 5, 17): "Grunnlovsdag",
+        date(year, 12, 25): "1. juledag",
+        date(year, 12, 26): "2. juledag",
+    }
+    for offset, name in (
+        (-3, "Skjærtorsdag"),
+        (-2, "Langfredag"),
+        (0, "1. påskedag"),
+        (1, "2. påskedag"),
+        (39, "Kristi himmelfartsdag"),
+        (49, "1. pinsedag"),
+        (50, "2. pinsedag"),
+    ):
+        holidays[easter + timedelta(days=offset)] = name
+    return holidays
+
+
+def parse_day(value):
+    return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+
+
+def load_overrides(path, shifts):
+    # Columns: start, end, kind, one column per shift, note. "end" and the
+    # shift counts may be left empty
+    overrides = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for line_no, row in enumerate(csv.DictReader(f), 2):
+            try:
+                start = parse_day(row["start"])
+                end = parse_day(row["end"]) if (row.get("end") or "").strip() else start
+            except (KeyError, ValueError):
+                raise ValueError(f"{path}:{line_no}: dates must be YYYY-MM-DD")
+            kind = (row.get("kind") or "").strip().lower()
+            if kind not in KINDS:
+                raise ValueError(
+                    f"{path}:{line_no}: unknown kind {kind!r}, "
+                    f"expected one of {', '.join(KINDS)}"
+                )
+            counts = {}
+            for shift in shifts:
+                value = (row.get(shift) or "").strip()
+                if value:
+                    if not value.isdigit():
+                        raise ValueError(
+                            f"{path}:{line_no}: {shift} must be a staff count"
+                        )
+                    counts[shift] = int(value)
+            overrides.append(
+                {
+                    "start": start,
+                    "end": end,
+                    "kind": kind,
+                    "shifts": counts,
+                    "note": (row.get("note") or "").strip(),
+                }
+            )
+    return overrides
+
+
+def apply_override(requirements, override):
+    # Explicit counts only touch their own shifts; without any, the kind
+    # decides for the whole day
+    if override["shifts"]:
+        requirements.update(override["shifts"])
+        return
+
+    kind = override["kind"]
+    for shift, required in requirements.items():
+        if kind in (CLOSED, HOLIDAY):
+            requirements[shift] = 0
+        elif kind == EXAM and required > 0:
+            requirements[shift] = max(1, required - 1)
+        elif kind == EVENT and required > 0:
+            requirements[shift] = required + 1
+
+
+def resolve_requirements(days, shifts, base_requirement, overrides=(), holidays=None):
+    holidays = holidays or {}
+    table = {}
+    notes = {}
+    for label, day in days.items():
+        matching = [o for o in overrides if o["start"] <= day <= o["end"]]
+        if not matching and day not in holidays:
+            continue
+
+        base = {shift: base_requirement(label, shift) for shift in shifts}
+        requirements = dict(base)
+        if matching:
+            # Rows from the file replace the built-in holiday rule, later rows
+            # win over earlier ones
+            for override in matching:
+                apply_override(requirements, override)
+            notes[label] = "; ".join(
+                override["note"] or override["kind"] for override in matching
+            )
+        else:
+            apply_override(requirements, {"kind": HOLIDAY, "shifts": {}})
+            notes[label] = holidays[day]
+
+        changed = {
+            shift: required
+            for shift, required in requirements.items()
+            if required != base[shift]
+        }
+        if changed:
+            table[label] = changed
+    return table, notes
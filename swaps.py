@@ -0,0 +1,125 @@
+NOT_ASSIGNED = "not_assigned"
+SAME_MEMBER = "same_member"
+UNAVAILABLE = "availability"
+CAPACITY = "capacity"
+MULTIPLE_SHIFTS = "multiple_shifts"
+CONSECUTIVE_DAYS = "consecutive_days"
+
+
+class SwapIndex:
+    def __init__(self, schedule, staff_availability, no_reply_members, days):
+        self.days = days
+        self.no_reply = set(no_reply_members)
+        self.offered = {
+            member: {(date, shift) for date, shifts in availability for shift in shifts}
+            for member, availability in staff_availability.items()
+        }
+        self.can_work = {}
+        for member, slots in self.offered.items():
+            for slot in slots:
+                self.can_work.setdefault(slot, set()).add(member)
+
+        # member -> {date: {shift}} and member -> {day: shifts that day}, so
+        # every rule below is a handful of dict lookups
+        self.shifts_on = {}
+        self.worked = {}
+        # Dicts rather than sets keep each slot's original order of names
+        self.holders = {}
+        self.closed = set()
+        for date, shifts in schedule.items():
+            for shift, staff_list in shifts.items():
+                if staff_list is None:
+                    self.closed.add((date, shift))
+                    continue
+                self.holders[(date, shift)] = {}
+                for member in staff_list:
+                    if member not in self.holders[(date, shift)]:
+                        self._add(member, (date, shift))
+
+    def _add(self, member, slot):
+        self.shifts_on.setdefault(member, {}).setdefault(slot[0], set()).add(slot[1])
+        worked = self.worked.setdefault(member, {})
+        day = self.days[slot[0]]
+        worked[day] = worked.get(day, 0) + 1
+        self.holders[slot][member] = None
+
+    def _remove(self, member, slot):
+        shifts = self.shifts_on[member][slot[0]]
+        shifts.discard(slot[1])
+        if not shifts:
+            del self.shifts_on[member][slot[0]]
+        worked = self.worked[member]
+        day = self.days[slot[0]]
+        worked[day] -= 1
+        if not worked[day]:
+            del worked[day]
+        self.holders[slot].pop(member, None)
+
+    def is_available(self, member, slot):
+        # No-reply members can be placed anywhere, same as when solving
+        return member in self.no_reply or slot in self.offered.get(member, ())
+
+    def holds(self, member, slot):
+        return slot[1] in self.shifts_on.get(member, {}).get(slot[0], ())
+
+    def fits(self, member, leaving, joining):
+        # Would member still have one shift per day and no two days in a row
+        # after trading leaving for joining?
+        if joining[0] != leaving[0] and joining[0] in self.shifts_on.get(member, {}):
+            return MULTIPLE_SHIFTS
+        day, old_day = self.days[joining[0]], self.days[leaving[0]]
+        worked = self.worked.get(member, {})
+        for neighbour in (day - 1, day + 1):
+            if worked.get(neighbour, 0) > (neighbour == old_day):
+                return CONSECUTIVE_DAYS
+        return None
+
+    def check_swap(self, member_a, slot_a, member_b, slot_b):
+        slot_a, slot_b = tuple(slot_a), tuple(slot_b)
+        if not (self.holds(member_a, slot_a) and self.holds(member_b, slot_b)):
+            return NOT_ASSIGNED
+        if member_a == member_b:
+            return SAME_MEMBER
+        if slot_a == slot_b:
+            return None
+        if member_a in self.holders[slot_b] or member_b in self.holders[slot_a]:
+            return CAPACITY
+        if not (
+            self.is_available(member_a, slot_b) and self.is_available(member_b, slot_a)
+        ):
+            return UNAVAILABLE
+        return self.fits(member_a, slot_a, slot_b) or self.fits(
+            member_b, slot_b, slot_a
+        )
+
+    def swap_partners(self, member, slot):
+        slot = tuple(slot)
+        if not self.holds(member, slot):
+            return []
+        partners = []
+        for other in self.can_work.get(slot, set()) | self.no_reply:
+            for date, shifts in self.shifts_on.get(other, {}).items():
+                for shift in shifts:
+                    if (date, shift) == slot:
+                        continue
+                    if self.check_swap(member, slot, other, (date, shift)) is None:
+                        partners.append((other, (date, shift)))
+        return partners
+
+    def apply_swap(self, member_a, slot_a, member_b, slot_b):
+        slot_a, slot_b = tuple(slot_a), tuple(slot_b)
+        reason = self.check_swap(member_a, slot_a, member_b, slot_b)
+        if reason is not None:
+            raise ValueError(f"Swap not allowed: {reason}")
+        self._remove(member_a, slot_a)
+        self._remove(member_b, slot_b)
+        self._add(member_a, slot_b)
+        self._add(member_b, slot_a)
+
+    def schedule(self):
+        schedule = {}
+        for (date, shift), members in self.holders.items():
+            schedule.setdefault(date, {})[shift] = list(members)
+        for date, shift in self.closed:
+            schedule.setdefault(date, {})[shift] = None
+        return schedule
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bar_scheduler  # noqa: E402
+
+
+class SolveAnytimeTest(unittest.TestCase):
+    def setUp(self):
+        bar_scheduler.USE_HISTORY = False
+        self.scheduler = bar_scheduler.BarScheduler()
+        self.scheduler.USERPATH = ROOT + "/"
+        self.scheduler.FILEPATH = os.path.join(ROOT, "mock_data.csv")
+        self.scheduler.SEED = 1
+        self.scheduler.reset_rng()
+        members = self.scheduler.load_members()
+        self.inputs = self.scheduler.prepare_schedule(members, stdlib=True)
+        self.members = members
+
+    def solve(self, time_budget=None, max_iterations=None):
+        self.scheduler.TIME_BUDGET = time_budget
+        self.scheduler.MAX_ITERATIONS = max_iterations
+        work_dates, all_dates, schedule, staff_availability = self.inputs
+        return self.scheduler.solve_anytime(
+            schedule, work_dates, all_dates, staff_availability, self.members
+        )
+
+    def assert_filled(self, schedule):
+        assigned = sum(
+            len(staff_list or ())
+            for shifts in schedule.values()
+            for staff_list in shifts.values()
+        )
+        self.assertGreater(assigned, 0)
+        self.assertIsNotNone(self.scheduler.rng_streams)
+
+    def test_zero_budget_runs_one_restart(self):
+        self.assert_filled(self.solve(time_budget=0))
+
+    def test_zero_iterations_runs_one_restart(self):
+        self.assert_filled(self.solve(max_iterations=0))
+
+
+if __name__ == "__main__":
+    unittest.main()